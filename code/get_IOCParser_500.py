@@ -1,10 +1,15 @@
 import pandas as pd
 import numpy as np 
 import requests 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import io
 import os 
 import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from tqdm import tqdm 
-import fitz 
+import pypdfium2 as pdfium
 
 
 start_year = 2014 
@@ -13,81 +18,139 @@ input_file = 'ArticlesDataset_500_Valid.csv'
 # 보고서 파일이 저장되어 있을 폴더 목록
 file_folder = ['APT_CyberCriminal_Campagin_Collections Reports']
 output_file = f'MergedArticles_IOCParsed_New.csv' # IOC 파싱 결과를 저장할 최종 CSV 파일 경로
+IOC_CONCURRENCY = 16 # IOCParser API 동시 요청 수
+# IOC API 요청 하나에 담을 최대 글자 수와 청크 간 겹침 크기
+IOC_CHUNK_SIZE = 200_000
+IOC_CHUNK_OVERLAP = 2_000
+# 입력 CSV에서 읽을 컬럼과 타입 (타입 추론 생략, Date는 로드 시 파싱)
+USECOLS = ['Date', 'Filename', 'Title', 'Download Url']
+DTYPES = {'Filename': 'string', 'Title': 'string', 'Download Url': 'string'}
+
+# 같은 호스트에 대한 TCP/TLS 연결을 재사용하기 위한 공유 세션 (keep-alive + 재시도)
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=frozenset({"GET", "POST"}),
+        raise_on_status=False, # 재시도 소진 시 마지막 응답을 그대로 반환하여 아래 상태 코드 처리를 따름
+    ),
+))
 
 def main():
     # 1. 데이터 로드
-    contents = pd.read_csv(input_file)
+    contents = pd.read_csv(input_file, engine='pyarrow', usecols=USECOLS, dtype=DTYPES, parse_dates=['Date'])
     
     # 2. 데이터 클리닝 및 필터링
     # contents.drop([0, 1], inplace=True) # 주석 처리됨 (특정 행 제거)
-    contents['Date'] = pd.to_datetime(contents['Date']) # 'Date' 컬럼을 datetime 객체로 변환
     # 지정된 연도 범위 (start_year ~ end_year) 내의 데이터만 필터링
     mask = (contents['Date'].dt.year >= start_year) & (contents['Date'].dt.year <= end_year)
     contents = contents.loc[mask]
     contents.reset_index(drop=True, inplace=True) # 필터링 후 인덱스 재설정
     
+    # 보고서 폴더를 한 번만 스캔하여 (연도, 파일명) -> 경로 인덱스 구성 (행마다 os.path.exists 호출 방지)
+    file_index = build_file_index()
+    
     # # 3. PDF 파일 다운로드
-    # get_pdfs(start_year, end_year, contents)
+    # get_pdfs(start_year, end_year, contents, file_index)
     
     # 4. 소스 파일 로드 (현재 get_data 내부에서 사용되지 않음)
     # with open('sources.txt', 'r') as f:
     #     initial_sources = f.read().split('\n')
         
+    # 이전 실행에서 이미 파싱된 기사는 건너뛰고 새 기사만 처리 (증분 실행)
+    output_exists = os.path.exists(output_file)
+    if output_exists:
+        done = set(pd.read_csv(output_file, engine='pyarrow', usecols=['Filename'])['Filename'])
+        contents = contents.loc[~contents['Filename'].isin(done)].reset_index(drop=True)
+        print(f"기존 결과 {len(done)}건 발견, 새로 처리할 기사: {len(contents)}건")
+        if contents.empty:
+            return
+        
     # 5. PDF에서 텍스트 추출 및 IOC 데이터 파싱
     # [오류 가능성]: get_data 함수 내부에서 extract_data_from_text(text, year) 호출 시 인자 불일치
-    cve, mitre, yara = get_data(start_year, end_year, contents)
+    cve, mitre, yara, ok = get_data(start_year, end_year, contents, file_index)
      
     # 6. 결과를 DataFrame에 추가
     contents["CVE"] = cve
     contents["MITRE"] = mitre
     contents["YARA"] = yara
+    
+    # 텍스트 추출이나 API 요청에 실패한 기사는 저장하지 않아 다음 실행에서 다시 처리되도록 함
+    contents = contents.loc[ok]
+    if len(contents) < len(ok):
+        print(f"처리 실패 {len(ok) - len(contents)}건은 저장하지 않고 다음 실행에서 재시도합니다.")
 
-    # 7. 최종 결과를 CSV 파일로 저장
-    contents.to_csv(output_file, index=False)
+    # 7. 결과를 CSV 파일에 추가 저장 (기존 행은 그대로 유지, 파일이 없을 때만 헤더 기록)
+    contents.to_csv(output_file, mode='a', header=not output_exists, index=False)
     
 
-def get_data(start_year, end_year, contents):
+def build_file_index():
+    """
+    ./Reports/{folder}/{year}/ 아래의 PDF를 os.scandir로 한 번만 스캔하여
+    {(연도, 파일명): 경로} 인덱스를 만듭니다. file_folder 앞쪽 폴더의 파일이 우선합니다.
+    """
+    file_index = {}
+    for folder in file_folder:
+        root = f'./Reports/{folder}'
+        if not os.path.isdir(root):
+            continue
+        for year_dir in os.scandir(root):
+            if not (year_dir.is_dir() and year_dir.name.isdigit()):
+                continue
+            year = int(year_dir.name)
+            for entry in os.scandir(year_dir.path):
+                if entry.name.endswith('.pdf'):
+                    file_index.setdefault((year, entry.name[:-4]), entry.path)
+    return file_index
+
+def get_data(start_year, end_year, contents, file_index):
     # [주의]: start_year, end_year, initial_sources는 현재 함수 내부에서 사용되지 않음.
     
     cve_list = []
     mitre_list = []
     yara_list = []
+    ok_list = [] # 기사별 성공 여부 (텍스트 추출 및 모든 API 요청 성공)
     
-    # DataFrame의 모든 기사에 대해 반복
-    for i in (progress_bar := tqdm(range(0, len(contents)))):
-        progress_bar.set_description("Extracting data from PDF")
-        year = contents['Date'][i].year
-        
-        # [오류 방지] PDF 텍스트가 추출되지 않았을 경우를 대비하여 초기화
-        text = "" 
-        
-        # 파일이 존재할 수 있는 모든 폴더를 탐색
-        for folder in file_folder:
-            try:
-                # 현재 보고서의 예상 파일 경로 구성
-                document = f'./Reports/{folder}/{year}/{contents["Filename"][i]}.pdf'
-                
-                # 파일이 실제로 존재하면 텍스트 추출 시작
-                if os.path.exists(document):
-                    text = extract_text_from_pdf(document)
-                    break  # 파일 발견 및 텍스트 추출 완료, 폴더 탐색 종료
-            except Exception as e:
-                # 텍스트 추출 중 오류가 발생하면 (매우 드물게) 출력하고 다음 폴더로 이동
-                print(f"Error extracting text from {document}: {e}")
-                continue
-        
-        # 추출된 텍스트를 사용하여 IOC API 호출
-        # [오류 가능성]: extract_data_from_text 함수는 인자가 'text' 하나만 필요하지만,
-        #              여기서는 'year'도 전달하려고 하고 있음. (extract_data_from_text(text, year))
-        #              extract_data_from_text 함수 정의를 수정하거나 'year'를 제거해야 함.
-        cve, mitre, yara = extract_data_from_text(text, year) 
-        
-        # 결과를 각 리스트에 추가
+    # 모든 기사의 (연도, PDF 경로)를 미리 구성 (컬럼을 배열로 한 번만 꺼내 행마다 Series 조회 방지)
+    years = contents['Date'].dt.year.tolist()
+    filenames = contents['Filename'].tolist()
+    paths = [file_index.get(key) for key in zip(years, filenames)]
+    
+    # 1) PDF 텍스트 추출은 CPU 바운드이므로 프로세스 풀로 병렬 처리
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+        texts = list(tqdm(ex.map(_extract_one, paths, chunksize=8), total=len(paths), desc="Extracting text from PDF"))
+    
+    # 2) IOC API 호출은 네트워크 I/O 바운드이므로 스레드 풀로 동시에 요청 (최대 IOC_CONCURRENCY개)
+    # [오류 가능성]: extract_data_from_text 함수는 인자가 'text' 하나만 필요하지만,
+    #              여기서는 'year'도 전달하려고 하고 있음. (extract_data_from_text(text, year))
+    #              extract_data_from_text 함수 정의를 수정하거나 'year'를 제거해야 함.
+    with ThreadPoolExecutor(max_workers=IOC_CONCURRENCY) as ex:
+        results = list(tqdm(ex.map(extract_data_from_text, texts, years), total=len(texts), desc="Parsing IOCs"))
+    
+    # 결과를 각 리스트에 추가 (입력 순서 유지)
+    for cve, mitre, yara, ok in results:
         cve_list.append(cve)
         mitre_list.append(mitre)
         yara_list.append(yara)
+        ok_list.append(ok)
         
-    return cve_list, mitre_list, yara_list
+    return cve_list, mitre_list, yara_list, ok_list
+
+def _extract_one(path):
+    """
+    프로세스 풀 워커: PDF 하나에서 텍스트를 추출합니다.
+    파일이 없는 경우 빈 문자열을 반환합니다.
+    """
+    if path is None:
+        return ""
+    return extract_text_from_pdf(path)
+
+# clean_output에서 제거할 문자(줄바꿈, 따옴표, 대괄호) 변환 테이블
+_CLEAN_TABLE = str.maketrans('', '', "\n'[]")
 
 def clean_output(list_str):
     """
@@ -98,30 +161,30 @@ def clean_output(list_str):
     if pd.isna(list_str) or list_str.strip() == "":
         return ""  # Return empty string if no information
     
-    # Remove unwanted characters and split by commas or newline
-    list_orig = list_str.replace('\n', '').replace("'", "").replace("[", "").replace("]", "").split(", ")
+    # Remove unwanted characters in one pass, split by commas and drop empty tokens
+    parts = (part.strip() for part in list_str.translate(_CLEAN_TABLE).split(","))
     # Rejoin as a comma-separated string
-    cleaned_list = ", ".join(list_orig).strip()
-    return cleaned_list
+    return ", ".join(part for part in parts if part)
+
+# 날짜 추출용 정규식 (모듈 로드 시 한 번만 컴파일)
+DATE_PATTERNS = [
+    r'\b\d{4}\b',  # Matches years (e.g., 2013, 2014)
+    r'\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{4}\b',  # "Month YYYY"
+    r'\b(?:Spring|Summer|Autumn|Fall|Winter)\s+\d{4}\b',  # "Season YYYY"
+    r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b',  # "DD/MM/YYYY" or "MM-DD-YYYY"
+    r'\b(?:Late|Early|Middle)\s+\w+\s+\d{4}\b'  # "Late October 2014"
+]
+DATE_RE = re.compile("|".join(DATE_PATTERNS))
+YEAR_RE = re.compile(r'\b\d{4}\b')
 
 '''
 def extract_dates_from_text(text, publish_date):
     # 이 함수는 현재 주석 처리되어 사용되지 않음 (날짜 추출 로직)
-    date_patterns = [
-        r'\b\d{4}\b',  # Matches years (e.g., 2013, 2014)
-        r'\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{4}\b',  # "Month YYYY"
-        r'\b(?:Spring|Summer|Autumn|Fall|Winter)\s+\d{4}\b',  # "Season YYYY"
-        r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b',  # "DD/MM/YYYY" or "MM-DD-YYYY"
-        r'\b(?:Late|Early|Middle)\s+\w+\s+\d{4}\b'  # "Late October 2014"
-    ]
-    combined_pattern = "|".join(date_patterns)
-    extracted_dates = re.findall(combined_pattern, text)
-
-    # Extract years from the matched dates
+    # 미리 컴파일된 DATE_RE / YEAR_RE를 사용하여 호출마다 패턴을 다시 컴파일하지 않음
     years = []
-    for date in extracted_dates:
+    for match in DATE_RE.finditer(text):
         # Check for YYYY format in extracted data
-        year_match = re.search(r'\b\d{4}\b', date)
+        year_match = YEAR_RE.search(match.group())
         if year_match:
             year = int(year_match.group())
             if 2000 <= year <= publish_date:  # Filter years between 2010 and publish_date
@@ -130,6 +193,20 @@ def extract_dates_from_text(text, publish_date):
     return sorted(set(years))
 '''
 
+def chunk_text(text, size=IOC_CHUNK_SIZE, overlap=IOC_CHUNK_OVERLAP):
+    """
+    긴 텍스트를 size 글자 단위로 나눕니다. 경계에 걸친 IOC가 잘리지 않도록 overlap만큼 겹칩니다.
+    """
+    # 마지막 청크가 텍스트 끝에 닿으면 멈춤 (size 이하의 텍스트는 요청 한 번)
+    for i in range(0, max(len(text) - overlap, 1), size - overlap):
+        yield text[i:i + size]
+
+def _merge_unique(results):
+    """
+    여러 청크의 결과 리스트를 처음 등장한 순서를 유지하며 중복 없이 합칩니다.
+    """
+    return list(dict.fromkeys(item for result in results for item in result))
+
 # [오류 가능성]: 이 함수는 'text' 인자만 받도록 정의되어 있지만, get_data에서 'year' 인자도 함께 전달받으려 하고 있음.
 # get_IOCParser.py (수정된 extract_data_from_text 함수)
 
@@ -137,6 +214,28 @@ def extract_dates_from_text(text, publish_date):
 def extract_data_from_text(text, year): 
     """
     텍스트에서 IOC(침해지표)를 추출하기 위해 IOCParser API에 요청을 보냅니다.
+    큰 보고서는 청크로 나누어 각각 요청한 뒤 결과를 병합·중복 제거합니다.
+    반환값: (cve, mitre, yara, 성공 여부). 텍스트가 비었거나 요청이 하나라도 실패하면 성공 여부는 False입니다.
+    """
+    if not text.strip():
+        return [], [], [], False
+    
+    # 문서 단위 병렬 처리는 get_data의 스레드 풀에서 이미 수행되므로 청크는 순차적으로 요청
+    results = [_post_ioc_chunk(chunk) for chunk in chunk_text(text)]
+    if any(r is None for r in results):
+        return [], [], [], False
+    if len(results) == 1:
+        return (*results[0], True)
+    
+    cve = _merge_unique(r[0] for r in results)
+    mitre = _merge_unique(r[1] for r in results)
+    yara = _merge_unique(r[2] for r in results)
+    return cve, mitre, yara, True
+
+def _post_ioc_chunk(text):
+    """
+    텍스트 청크 하나를 IOCParser API에 보내 (CVE, MITRE, YARA) 리스트를 반환합니다.
+    요청이 실패하면 None을 반환합니다.
     """
     payload = text 
     url = "https://api.iocparser.com/raw"
@@ -146,7 +245,7 @@ def extract_data_from_text(text, year):
 
     # API 요청: text/plain이므로 'data=payload' 사용
     # json=payload는 payload를 JSON 형식으로 직렬화하려 시도하므로 부적절할 수 있습니다.
-    response = requests.request("POST", url, headers=headers, data=payload)
+    response = SESSION.post(url, data=payload, headers=headers, timeout=30)
         
     # --- 1. 상태 코드별 처리 ---
     
@@ -159,7 +258,7 @@ def extract_data_from_text(text, year):
         # 4xx (Client Error) 또는 5xx (Server Error)
         print(f"HTTP 요청 실패! 상태 코드: {response.status_code}")
         print("서버 오류 메시지:", response.text[:500])
-        return [], [], [] # 즉시 빈 리스트 반환 및 함수 종료
+        return None # 실패로 표시하고 함수 종료
         
     # 200 (OK)인 경우 처리
     if response.status_code == 200:
@@ -184,7 +283,7 @@ def extract_data_from_text(text, year):
             # 200이지만 응답 본문이 깨졌을 경우를 위한 안전 장치
             print(f"JSON 디코딩 오류 발생 (200 상태): {e}")
             print("응답 텍스트 미리보기:", response.text[:200])
-            return [], [], [] 
+            return None 
     
     # [불필요한 코드 제거]: 아래 코드는 위의 if/elif/if/except 블록 이후에 도달할 수 없으므로 제거
     # cve = response.json()['data']['CVE']
@@ -193,58 +292,76 @@ def extract_data_from_text(text, year):
     # return cve, mitre, yara
     
     # 위의 모든 조건을 통과했지만 200이 아닌 예외적인 경우를 대비하여 추가 (선택 사항)
-    return [], [], [] # 안전 장치
+    return None # 안전 장치 (실패로 표시)
 
-def get_pdfs(start_year, end_year, contents):       
+def get_pdfs(start_year, end_year, contents, file_index):       
     """
     DataFrame에 있는 'Download Url'을 사용하여 PDF 파일을 다운로드하고 저장합니다.
     이미 파일이 존재하는지 확인하여 중복 다운로드를 방지합니다.
     """
-    for i in (progress_bar := tqdm(range(len(contents)))):
-        year = contents['Date'][i].year
+    # 컬럼을 미리 배열로 꺼내 루프 내 Series 라벨 조회 제거
+    years = contents['Date'].dt.year.to_numpy()
+    filenames = contents['Filename'].to_numpy(object)
+    urls = contents['Download Url'].to_numpy(object)
+    
+    for year, filename, url in (progress_bar := tqdm(zip(years, filenames, urls), total=len(contents))):
+        year = int(year)
         
         # 지정된 연도 범위 내에서만 다운로드 진행
         if start_year <= year <= end_year:
-            filename = contents['Filename'][i]
-            file_found = False
-            
-            # 파일이 존재할 수 있는 폴더를 순회하며 확인
-            for folder in file_folder:
-                directory = f'./Reports/{folder}/{year}'
-                file_path = f'{directory}/{filename}.pdf'
-                
-                if os.path.exists(file_path):
-                    file_found = True
-                    break # 파일 발견 시 순회 종료
             
+            # 미리 구성한 인덱스로 파일 존재 여부 확인 (파일 시스템 호출 없음)
             # 파일이 존재하지 않는 경우에만 다운로드 수행
-            if not file_found:
+            if (year, filename) not in file_index:
+                # [주의]: 새 파일은 file_folder 목록의 마지막 폴더에 저장됩니다.
+                directory = f'./Reports/{file_folder[-1]}/{year}'
+                file_path = f'{directory}/{filename}.pdf'
                 # 파일을 저장할 디렉토리가 없으면 생성
-                if not os.path.exists(directory):
-                    # [주의]: 여기서 'directory'는 마지막 순회 폴더 기준으로 생성되므로,
-                    #         file_folder 목록 중 첫 번째 폴더에 저장될 것입니다.
-                    os.makedirs(directory)
-
-                # PDF 다운로드 및 저장
-                response = requests.get(contents['Download Url'][i])
-                with open(file_path, 'wb') as f:
-                    f.write(response.content)
+                os.makedirs(directory, exist_ok=True)
+
+                # PDF 다운로드 및 저장 (본문 전체를 메모리에 올리지 않고 1MiB 단위로 스트리밍 기록)
+                with SESSION.get(url, stream=True, timeout=60) as response:
+                    if response.status_code == 200:
+                        response.raw.decode_content = True # gzip 등 전송 인코딩 해제
+                        with open(file_path, 'wb') as f:
+                            shutil.copyfileobj(response.raw, f, length=1 << 20)
+                        file_index[(year, filename)] = file_path
                 
         progress_bar.set_description('Downloading PDF articles')
 
+def _iter_page_texts(pdf):
+    """
+    페이지를 하나씩 열어 텍스트를 생성하고, 매 반복마다 PDFium 네이티브 버퍼를 해제합니다.
+    """
+    for i in range(len(pdf)):
+        page = pdf.get_page(i)
+        textpage = page.get_textpage()
+        try:
+            yield textpage.get_text_bounded()
+        finally:
+            textpage.close()
+            page.close()
+
 def extract_text_from_pdf(filename):
     """
-    PyMuPDF (fitz) 라이브러리를 사용하여 PDF 파일에서 텍스트를 추출합니다.
+    pypdfium2 (PDFium) 라이브러리를 사용하여 PDF 파일에서 텍스트를 추출합니다.
+    파일 경로를 PDFium에 넘겨 직접 읽게 하고, 페이지 단위로 스트리밍하여 메모리 사용량을 일정하게 유지합니다.
     """
-    text = ""
     try:
-        doc = fitz.open(filename)
-        for page in doc:
-            text += page.get_text() # 페이지별 텍스트를 누적
-        return text
-    except:
-        # PDF 파일이 손상되었거나 열 수 없는 경우 빈 문자열 반환
-        return text
+        pdf = pdfium.PdfDocument(filename)
+        try:
+            buf = io.StringIO()
+            for n, page_text in enumerate(_iter_page_texts(pdf)):
+                if n:
+                    buf.write("\n")
+                buf.write(page_text)
+            return buf.getvalue()
+        finally:
+            pdf.close()
+    except (pdfium.PdfiumError, OSError) as e:
+        # PDF 파일이 손상되었거나 열 수 없는 경우 원인을 기록하고 빈 문자열 반환
+        print(f"PDF 텍스트 추출 실패: {filename} ({e})")
+        return ""
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
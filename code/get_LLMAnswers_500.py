@@ -1,8 +1,10 @@
 import os
+import re
 import time
 from pathlib import Path
 
 import pandas as pd
+import pyarrow.parquet as pq
 from tqdm import tqdm
 from dotenv import load_dotenv
 from langchain_community.vectorstores import FAISS
@@ -21,13 +23,19 @@ if not CSV_FILE.exists():
     CSV_FILE = PROJECT_ROOT / "code" / "ArticlesDataset_500_Valid.csv"
 VECTORSTORE_DIR = PROJECT_ROOT / "vectorstore_gemini_embeddings"
 OUTPUT_FILE = PROJECT_ROOT / "ArticlesDataset_LLMAnswered.csv"
+# Resumable checkpoint (one Parquet part per batch); OUTPUT_FILE is exported from it at the end of each run
+CHECKPOINT_DIR = PROJECT_ROOT / "ArticlesDataset_LLMAnswered.parquet"
+CSV_USECOLS = ["Date", "Filename", "Title", "Download Url"]
+CSV_DTYPES = {"Filename": "string", "Download Url": "string", "Title": "string"}
 
 LLM_MODEL = "gemini-2.5-flash"
 EMBEDDING_MODEL = "text-embedding-004"
 BATCH_SIZE = 5
 
 MAX_REQUESTS = 700
-SLEEP_TIME = 1
+REQUESTS_PER_MINUTE = 60
+RATE_LIMIT_RETRIES = 3
+DEFAULT_RETRY_AFTER = 30
 
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
@@ -58,6 +66,11 @@ QUESTION_MAP = [
         "Target Sector",
     ),
 ]
+QUESTIONS = [question for question, _ in QUESTION_MAP]
+COLUMNS = [column for _, column in QUESTION_MAP]
+
+# The vectors are already stored in FAISS, so one embeddings instance serves every article
+EMBEDDINGS = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=GOOGLE_API_KEY)
 
 
 def load_knowledge_base(article: str) -> FAISS:
@@ -72,8 +85,7 @@ def load_knowledge_base(article: str) -> FAISS:
             f"FAISS vector store not found for article '{article}' at {db_path}. "
             f"Please run preprocessPdf_Submission.py first to generate embeddings."
         )
-    embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=GOOGLE_API_KEY)
-    return FAISS.load_local(str(db_path), embeddings, allow_dangerous_deserialization=True)
+    return FAISS.load_local(str(db_path), EMBEDDINGS, allow_dangerous_deserialization=True)
 
 
 def load_llm() -> GoogleGenerativeAI:
@@ -100,6 +112,74 @@ question = {question}
     return ChatPromptTemplate.from_template(prompt)
 
 
+class TokenBucket:
+    """Client-side rate limiter: callers only sleep once the per-minute budget is used up."""
+
+    def __init__(self, requests_per_minute: int):
+        self.capacity = requests_per_minute
+        self.tokens = float(requests_per_minute)
+        self.fill_rate = requests_per_minute / 60
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    def acquire(self, n: int = 1) -> None:
+        self._refill()
+        if self.tokens < n:
+            time.sleep((n - self.tokens) / self.fill_rate)
+            self._refill()
+        self.tokens -= n
+
+
+RETRY_IN_RE = re.compile(r"retry in (\d+(?:\.\d+)?)s", re.IGNORECASE)
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    message = str(exc)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message or type(exc).__name__ == "ResourceExhausted"
+
+
+def retry_after_seconds(exc: Exception) -> float:
+    """Read the server's back-off hint from a Retry-After header or the error message."""
+    response = getattr(exc, "response", None)
+    header = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    if header and header.isdigit():
+        return float(header)
+    match = RETRY_IN_RE.search(str(exc))
+    if match:
+        return float(match.group(1))
+    return DEFAULT_RETRY_AFTER
+
+
+def ask_questions(rag_chain, bucket: TokenBucket) -> list:
+    """Ask every question concurrently; re-ask only the rate-limited ones after the server's back-off."""
+    responses = [None] * len(QUESTIONS)
+    pending = list(range(len(QUESTIONS)))
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        bucket.acquire(len(pending))
+        # Failures come back as exceptions instead of aborting the batch
+        results = rag_chain.batch(
+            [QUESTIONS[k] for k in pending],
+            config={"max_concurrency": len(pending)},
+            return_exceptions=True,
+        )
+        limited = []
+        for k, result in zip(pending, results):
+            responses[k] = result
+            if isinstance(result, Exception) and is_rate_limited(result):
+                limited.append(k)
+        if not limited or attempt == RATE_LIMIT_RETRIES:
+            break
+        wait = max(retry_after_seconds(responses[k]) for k in limited)
+        print(f"Rate limited on {len(limited)} question(s); retrying in {wait:.0f}s")
+        time.sleep(wait)
+        pending = limited
+    return responses
+
+
 def format_docs(docs) -> str:
     return "\n\n".join(doc.page_content for doc in docs)
 
@@ -116,6 +196,20 @@ def initialize_all_answers() -> dict:
     return base
 
 
+def checkpoint_parts() -> list[Path]:
+    if not CHECKPOINT_DIR.exists():
+        return []
+    return sorted(CHECKPOINT_DIR.glob("part-*.parquet"))
+
+
+def write_checkpoint_part(df: pd.DataFrame, first_index: int) -> None:
+    """Append one batch to the checkpoint as its own Parquet part, named by its first row index."""
+    CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+    # Pin text columns to string so every part shares one schema, even when a column is all-NA
+    df = df.astype({column: "string" for column in df.columns if column != "Date"})
+    df.to_parquet(CHECKPOINT_DIR / f"part-{first_index:05d}.parquet", compression="zstd", index=False)
+
+
 def main():
     print(f"The {LLM_MODEL} model was chosen.\n")
     print(f"The {EMBEDDING_MODEL} embedding model was chosen.\n")
@@ -126,29 +220,45 @@ def main():
             f"Please ensure ArticlesDataset_500_Valid.csv exists in the project root or code/ directory."
         )
     
-    contents = pd.read_csv(CSV_FILE)
+    contents = pd.read_csv(CSV_FILE, engine="pyarrow", usecols=CSV_USECOLS, dtype=CSV_DTYPES, parse_dates=["Date"])
 
-    if OUTPUT_FILE.exists() and OUTPUT_FILE.stat().st_size > 0:
-        output_df = pd.read_csv(OUTPUT_FILE)
-        start_index = output_df.shape[0]
+    parts = checkpoint_parts()
+    if not parts and OUTPUT_FILE.exists() and OUTPUT_FILE.stat().st_size > 0:
+        # Seed the checkpoint from a CSV written by an earlier version of this script
+        write_checkpoint_part(pd.read_csv(OUTPUT_FILE, engine="pyarrow", parse_dates=["Date"]), 0)
+        parts = checkpoint_parts()
+
+    if parts:
+        start_index = sum(pq.ParquetFile(part).metadata.num_rows for part in parts)
+        checkpoint_columns = pq.read_schema(parts[0]).names
         print(f"Resuming from index {start_index} (found {start_index} completed articles)")
         # Verify we're not trying to resume beyond available articles
         if start_index >= len(contents):
             print(f"All articles already processed! Exiting.")
             return
     else:
-        output_df = pd.DataFrame()
+        checkpoint_columns = []
         start_index = 0
         print("Starting processing from the beginning")
 
     llm = load_llm()
     prompt = load_prompt()
+    # Article-independent tail of the chain; only the retriever is bound per article
+    answer_chain = prompt | llm | StrOutputParser()
+    bucket = TokenBucket(REQUESTS_PER_MINUTE)
 
     cnt = 0
+    written = start_index
     request_count = 0
     batch_answers = initialize_all_answers()
     total_articles = len(contents)
 
+    # Pull the columns out once so the loop reads plain arrays instead of Series lookups
+    dates = contents["Date"].to_numpy()
+    filenames = contents["Filename"].to_numpy(object)
+    titles = contents["Title"].to_numpy(object) if "Title" in contents.columns else [""] * total_articles
+    urls = contents["Download Url"].to_numpy(object)
+
     for i in (progress_bar := tqdm(range(start_index, total_articles))):
         # Check if we've reached the request limit
         if request_count >= MAX_REQUESTS:
@@ -163,7 +273,7 @@ def main():
             print(f"{'='*70}\n")
             break
 
-        article = contents["Filename"][i]
+        article = filenames[i]
         progress_bar.set_description(f"Processing {article} [Requests: {request_count}/{MAX_REQUESTS}]")
 
         try:
@@ -175,62 +285,49 @@ def main():
         
         retriever = knowledge_base.as_retriever(search_kwargs={"k": 4})
 
-        rag_chain = (
-            {"context": retriever | format_docs, "question": RunnablePassthrough()}
-            | prompt
-            | llm
-            | StrOutputParser()
-        )
+        rag_chain = {"context": retriever | format_docs, "question": RunnablePassthrough()} | answer_chain
 
+        # Not enough budget left for all questions - let this article be processed fully on the next run
+        if request_count + len(QUESTIONS) > MAX_REQUESTS:
+            break
+
+        responses = ask_questions(rag_chain, bucket)
         answers = {}
-        article_complete = True
-        for question, column in QUESTION_MAP:
-            # Check request limit before each API call
-            if request_count >= MAX_REQUESTS:
-                article_complete = False
-                break
-            
-            try:
-                response = rag_chain.invoke(question)
-                request_count += 1
-            except Exception as exc:  # noqa: BLE001
-                print(f"Failed to process question '{question}' for {article}: {exc}")
+        for question, column, response in zip(QUESTIONS, COLUMNS, responses):
+            if isinstance(response, Exception):
+                print(f"Failed to process question '{question}' for {article}: {response}")
                 response = "Error processing question"
                 # Don't increment on error (API call may not have been made)
+            else:
+                request_count += 1
             answers[column] = response
-            time.sleep(SLEEP_TIME)
-        
-        # Only save complete articles (all 6 questions answered)
-        if article_complete:
-            batch_answers["Date"].append(contents["Date"][i])
-            batch_answers["Filename"].append(contents["Filename"][i])
-            batch_answers["Title"].append(contents["Title"][i] if "Title" in contents.columns else "")
-            batch_answers["Download Url"].append(contents["Download Url"][i])
-            for _, column in QUESTION_MAP:
-                batch_answers[column].append(answers.get(column, "Not mentioned"))
-            cnt += 1
-        else:
-            # Hit limit mid-article - break and let it be processed fully on next run
-            break
+
+        batch_answers["Date"].append(dates[i])
+        batch_answers["Filename"].append(article)
+        batch_answers["Title"].append(titles[i])
+        batch_answers["Download Url"].append(urls[i])
+        for column in COLUMNS:
+            batch_answers[column].append(answers.get(column, "Not mentioned"))
+        cnt += 1
         if cnt == BATCH_SIZE:
             cnt = 0
             new_answers_df = pd.DataFrame(batch_answers)
-            if not output_df.empty:
-                missing_cols = set(output_df.columns) - set(new_answers_df.columns)
-                for col in missing_cols:
-                    new_answers_df[col] = "Not specified"
-            output_df = pd.concat([output_df, new_answers_df], ignore_index=True)
-            output_df.to_csv(OUTPUT_FILE, index=False)
+            missing_cols = set(checkpoint_columns) - set(new_answers_df.columns)
+            for col in missing_cols:
+                new_answers_df[col] = "Not specified"
+            write_checkpoint_part(new_answers_df, written)
+            written += len(new_answers_df)
             batch_answers = initialize_all_answers()
 
     if cnt > 0:
         new_answers_df = pd.DataFrame(batch_answers)
-        output_df = pd.concat([output_df, new_answers_df], ignore_index=True)
-        output_df.to_csv(OUTPUT_FILE, index=False)
+        write_checkpoint_part(new_answers_df, written)
+        written += len(new_answers_df)
     
     # Final summary
-    if OUTPUT_FILE.exists():
-        final_df = pd.read_csv(OUTPUT_FILE)
+    if checkpoint_parts():
+        final_df = pd.read_parquet(CHECKPOINT_DIR)
+        final_df.to_csv(OUTPUT_FILE, index=False)
         print(f"\n{'='*70}")
         print(f"Session Summary:")
         print(f"  Total requests made: {request_count}")
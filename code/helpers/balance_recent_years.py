@@ -4,13 +4,21 @@ while keeping the overall dataset at 500 reports.
 """
 
 import random
+import shutil
+import threading
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlparse
 
+import numpy as np
 import pandas as pd
 import requests
-from PyPDF2 import PdfReader
+import pypdfium2 as pdfium
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
+from urllib3.util.retry import Retry
 
 # Configuration
 FULL_CSV = "code/Technical_Report_Collection.csv"
@@ -20,15 +28,57 @@ BASE_DIR = Path("Reports/APT_CyberCriminal_Campagin_Collections Reports")
 YEARS_TO_BALANCE = {2022: 45, 2023: 25}
 TARGET_TOTAL = 500
 MIN_SIZE_KB = 50
+SMOKE_TEST_MAX_KB = 100
 TIMEOUT = 60
 RANDOM_SEED = 1337
+MAX_WORKERS = 8
+PER_HOST_LIMIT = 4  # concurrent downloads allowed against a single host
+HOST_MIN_INTERVAL = 0.3  # seconds between request starts on the same host
+COPY_BUFFER = 1 << 20  # bytes copied from the socket to disk per read/write
+USECOLS = ["Date", "Filename", "Title", "Download Url"]
+DTYPES = {"Filename": "string", "Title": "string", "Download Url": "string"}
+
+# PDFs are already compressed; ask for the raw bytes so nothing is inflated client-side
+HEADERS = {"User-Agent": "Mozilla/5.0", "Accept-Encoding": "identity"}
+
+# Shared session so repeated downloads reuse keep-alive connections per host
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=[429, 502, 503, 504],
+            raise_on_status=False,
+        ),
+    ),
+)
+
+_HOST_LOCK = threading.Lock()
+_HOST_SLOTS: defaultdict[str, threading.BoundedSemaphore] = defaultdict(
+    lambda: threading.BoundedSemaphore(PER_HOST_LIMIT)
+)
+_HOST_NEXT_START: dict[str, float] = {}
+
+
+def read_reports_csv(path) -> pd.DataFrame:
+    """Load a report list with fixed columns and dtypes, parsing Date up front."""
+    return pd.read_csv(
+        path, engine="pyarrow", usecols=USECOLS, dtype=DTYPES, parse_dates=["Date"]
+    )
+
+
+# invalid filename characters -> "_" in a single str.translate pass
+_SANITIZE_TABLE = str.maketrans({c: "_" for c in '<>:"/\\|?*'})
 
 
 def sanitize_filename(filename: str) -> str:
     """Ensure filenames are filesystem-safe and end with .pdf"""
-    invalid_chars = '<>:"/\\|?*'
-    for char in invalid_chars:
-        filename = filename.replace(char, "_")
+    filename = filename.translate(_SANITIZE_TABLE)
     if not filename.lower().endswith(".pdf"):
         filename += ".pdf"
     return filename
@@ -44,91 +94,94 @@ def check_pdf_valid(pdf_path: Path) -> tuple[bool, str]:
         if size_kb < MIN_SIZE_KB:
             return False, f"Too small ({size_kb:.1f} KB)"
 
-        reader = PdfReader(str(pdf_path))
-        if len(reader.pages) == 0:
-            return False, "Zero pages"
-
-        _ = reader.pages[0].extract_text()  # smoke test
-        return True, "Valid"
+        # PDFium only parses the header and trailer to count pages
+        pdf = pdfium.PdfDocument(str(pdf_path))
+        try:
+            n_pages = len(pdf)
+            if n_pages == 0:
+                return False, "Zero pages"
+
+            # small files get a text smoke test; the page count alone is weak signal there
+            if size_kb < SMOKE_TEST_MAX_KB:
+                page = pdf[0]
+                textpage = page.get_textpage()
+                textpage.get_text_bounded()
+                textpage.close()
+                page.close()
+        finally:
+            pdf.close()
+        return True, f"{n_pages} pages"
+    except pdfium.PdfiumError as exc:
+        return False, f"Corrupt: {str(exc)[:40]}"
     except Exception as exc:  # noqa: BLE001
         return False, f"Error: {str(exc)[:40]}"
 
 
-def download_and_validate(url: str, dest_path: Path) -> tuple[bool, bool, str]:
-    """Download a PDF and validate immediately."""
+def wait_for_host(host: str) -> None:
+    """Space out request starts on the same host by HOST_MIN_INTERVAL."""
+    with _HOST_LOCK:
+        now = time.monotonic()
+        start = max(now, _HOST_NEXT_START.get(host, 0.0))
+        _HOST_NEXT_START[host] = start + HOST_MIN_INTERVAL
+    if start > now:
+        time.sleep(start - now)
+
+
+def download_pdf(url: str, dest_path: Path) -> tuple[bool, str]:
+    """Download a PDF, holding a per-host slot for the duration of the request."""
+    host = urlparse(url).netloc
+    with _HOST_LOCK:
+        slot = _HOST_SLOTS[host]
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, timeout=TIMEOUT, headers=headers, stream=True)
-
-        if response.status_code == 404:
-            return False, False, "404 not found"
-        if response.status_code != 200:
-            return False, False, f"HTTP {response.status_code}"
-
-        with open(dest_path, "wb") as handle:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    handle.write(chunk)
-
-        is_valid, msg = check_pdf_valid(dest_path)
-        if not is_valid and dest_path.exists():
-            dest_path.unlink()
-        return True, is_valid, msg
+        with slot:
+            wait_for_host(host)
+            response = SESSION.get(url, stream=True, timeout=TIMEOUT)
+
+            if response.status_code == 404:
+                return False, "404 not found"
+            if response.status_code != 200:
+                return False, f"HTTP {response.status_code}"
+
+            response.raw.decode_content = True  # undo gzip/deflate transfer encoding
+            with open(dest_path, "wb") as handle:
+                shutil.copyfileobj(response.raw, handle, length=COPY_BUFFER)
+        return True, "Downloaded"
     except requests.Timeout:
-        return False, False, "Timeout"
+        return False, "Timeout"
     except Exception as exc:  # noqa: BLE001
-        return False, False, f"Error: {str(exc)[:40]}"
+        return False, f"Error: {str(exc)[:40]}"
 
 
 def compute_expected_counts(df_original: pd.DataFrame) -> dict[int, int]:
     """Scale original distribution down to TARGET_TOTAL with unbiased rounding."""
-    counts = (
-        pd.to_datetime(df_original["Date"]).dt.year.value_counts().sort_index()
-    )
-    total = counts.sum()
-
-    raw_expected: dict[int, int] = {}
-    remainders: list[tuple[float, int]] = []
-    running_total = 0
+    counts = df_original["Year"].value_counts().sort_index()
+    values = counts.to_numpy()
 
-    for year, count in counts.items():
-        exact = count / total * TARGET_TOTAL
-        floored = int(exact)
-        raw_expected[year] = floored
-        remainders.append((exact - floored, year))
-        running_total += floored
+    # largest-remainder rounding: floor everything, then hand the leftover
+    # units to the years with the biggest fractional parts (ties go to the later year)
+    exact = values / values.sum() * TARGET_TOTAL
+    floored = np.floor(exact).astype(int)
+    order = np.lexsort((counts.index.to_numpy(), exact - floored))[::-1]
+    floored[order[: TARGET_TOTAL - floored.sum()]] += 1
 
-    remainder = TARGET_TOTAL - running_total
-    remainders.sort(reverse=True)
-    idx = 0
-    while remainder > 0 and idx < len(remainders):
-        _, year = remainders[idx]
-        raw_expected[year] += 1
-        remainder -= 1
-        idx += 1
-
-    return raw_expected
+    return dict(zip(counts.index.tolist(), floored.tolist()))
 
 
 def drop_surplus_rows(
     df: pd.DataFrame, expected_counts: dict[int, int], rng: random.Random
 ) -> pd.DataFrame:
     """Remove rows from over-represented years to match expected counts."""
-    df = df.copy()
-    df["Year"] = pd.to_datetime(df["Date"]).dt.year
-
     to_drop = []
     for year, group in df.groupby("Year"):
         allowed = expected_counts.get(year, 0)
         excess = len(group) - allowed
         if excess > 0:
-            drop_idx = rng.sample(list(group.index), k=excess)
-            to_drop.extend(drop_idx)
+            to_drop.extend(rng.sample(list(group.index), k=excess))
 
     if to_drop:
         df = df.drop(index=to_drop)
 
-    return df.drop(columns=["Year"])
+    return df
 
 
 def main():
@@ -136,11 +189,13 @@ def main():
     print("Balancing 2022/2023 coverage")
     print("=" * 70)
 
-    df_current = pd.read_csv(CURRENT_CSV)
-    df_current["Year"] = pd.to_datetime(df_current["Date"]).dt.year
+    # dates are parsed at load time; every count and filter below reuses the integer Year column
+    df_current = read_reports_csv(CURRENT_CSV)
+    df_current["Year"] = df_current["Date"].dt.year.to_numpy()
     current_counts = df_current["Year"].value_counts().sort_index()
 
-    df_original = pd.read_csv(FULL_CSV)
+    df_original = read_reports_csv(FULL_CSV)
+    df_original["Year"] = df_original["Date"].dt.year.to_numpy()
     expected_counts = compute_expected_counts(df_original)
 
     print("\nTarget counts (scaled from full dataset):")
@@ -162,7 +217,6 @@ def main():
         for year, need in deficits.items():
             if need > 0:
                 print(f"  - {year}: +{need}")
-        df_original["Year"] = pd.to_datetime(df_original["Date"]).dt.year
         current_files = set(df_current["Filename"].tolist())
         new_rows = []
         rng = random.Random(RANDOM_SEED)
@@ -187,47 +241,61 @@ def main():
 
             collected = 0
             stats = {"downloaded": 0, "valid": 0, "invalid": 0, "failed": 0}
+            dest_dir = BASE_DIR / str(year)
+            dest_dir.mkdir(parents=True, exist_ok=True)
 
-            for _, row in tqdm(
-                year_candidates.iterrows(),
-                total=len(year_candidates),
-                desc=f"{year} candidates",
-                unit="pdf",
-            ):
+            # re-validate anything already downloaded earlier before hitting the network
+            to_download = []
+            for _, row in year_candidates.iterrows():
                 if collected >= need:
                     break
 
-                filename = row["Filename"]
-                url = row["Download Url"]
-                dest_dir = BASE_DIR / str(year)
-                dest_dir.mkdir(parents=True, exist_ok=True)
-                dest_path = dest_dir / sanitize_filename(filename)
-
-                # re-validate if already downloaded earlier
+                dest_path = dest_dir / sanitize_filename(row["Filename"])
                 if dest_path.exists():
                     is_valid, msg = check_pdf_valid(dest_path)
                     if is_valid:
                         new_rows.append(row)
-                        current_files.add(filename)
+                        current_files.add(row["Filename"])
                         collected += 1
                         stats["valid"] += 1
                         continue
                     dest_path.unlink()
-
-                downloaded, valid, msg = download_and_validate(url, dest_path)
-                if downloaded:
-                    stats["downloaded"] += 1
-                    if valid:
-                        new_rows.append(row)
-                        current_files.add(filename)
-                        collected += 1
-                        stats["valid"] += 1
-                    else:
-                        stats["invalid"] += 1
-                else:
-                    stats["failed"] += 1
-
-                time.sleep(0.3)
+                to_download.append((row, dest_path))
+
+            # download in waves of twice the remaining deficit; validate on this thread
+            # in candidate order so the selection does not depend on network timing
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, tqdm(
+                total=need, initial=collected, desc=f"{year} valid", unit="pdf"
+            ) as pbar:
+                start = 0
+                while collected < need and start < len(to_download):
+                    wave = to_download[start : start + (need - collected) * 2]
+                    start += len(wave)
+                    futures = [
+                        executor.submit(download_pdf, row["Download Url"], dest_path)
+                        for row, dest_path in wave
+                    ]
+
+                    for (row, dest_path), future in zip(wave, futures):
+                        downloaded, msg = future.result()
+                        if not downloaded:
+                            stats["failed"] += 1
+                            continue
+
+                        stats["downloaded"] += 1
+                        if collected >= need:
+                            continue  # surplus download; kept on disk for a future run
+
+                        is_valid, msg = check_pdf_valid(dest_path)
+                        if is_valid:
+                            new_rows.append(row)
+                            current_files.add(row["Filename"])
+                            collected += 1
+                            stats["valid"] += 1
+                            pbar.update(1)
+                        else:
+                            stats["invalid"] += 1
+                            dest_path.unlink(missing_ok=True)
 
             print(
                 f"  Added {collected}/{need} valid PDFs "
@@ -239,18 +307,15 @@ def main():
             return
 
         df_new = pd.DataFrame(new_rows)
-        df_current = pd.concat(
-            [df_current.drop(columns=["Year"]), df_new], ignore_index=True
-        )
+        df_current = pd.concat([df_current, df_new], ignore_index=True)
 
     # Recompute counts and drop surplus rows from early years
     df_balanced = drop_surplus_rows(
         df_current, expected_counts=expected_counts, rng=random.Random(RANDOM_SEED)
     )
 
-    df_balanced.to_csv(OUTPUT_CSV, index=False)
+    df_balanced.drop(columns=["Year"]).to_csv(OUTPUT_CSV, index=False)
 
-    df_balanced["Year"] = pd.to_datetime(df_balanced["Date"]).dt.year
     final_counts = df_balanced["Year"].value_counts().sort_index()
 
     print("\nFinal distribution after balancing:")
@@ -4,39 +4,75 @@ Downloads from URLs specified in the CSV file
 """
 
 import pandas as pd
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from tqdm import tqdm
 import time
+import threading
+from collections import defaultdict
+from urllib.parse import urlparse
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Configuration
 INPUT_CSV = "ArticlesDataset_500_Valid.csv"
 BASE_DIR = Path("Reports/APT_CyberCriminal_Campagin_Collections Reports")
 TIMEOUT = 60  # seconds
 RETRY_ATTEMPTS = 3
-DELAY_BETWEEN_DOWNLOADS = 0.5  # seconds (be nice to servers)
+PER_HOST_LIMIT = 4  # concurrent downloads allowed against a single host
+HOST_MIN_INTERVAL = 0.5  # seconds between request starts on the same host (be nice to servers)
+MAX_WORKERS = 16  # concurrent downloads
+MIN_FILE_BYTES = 1000  # anything smaller is not a real PDF
+COPY_BUFFER = 1 << 20  # bytes copied from the socket to disk per read/write
+HAS_FADVISE = hasattr(os, 'posix_fadvise')  # page-cache hints (not available on Windows/macOS)
+
+# PDFs are already compressed; ask for the raw bytes so nothing is inflated client-side
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept-Encoding': 'identity',
+}
+
+# Shared session: keep-alive connections are reused per host, and the adapter retries failures
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=RETRY_ATTEMPTS,
+        backoff_factor=1,
+        status_forcelist=[502, 503, 504],
+        raise_on_status=False,
+    ),
+)
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+
+_HOST_LOCK = threading.Lock()
+_HOST_SLOTS = defaultdict(lambda: threading.BoundedSemaphore(PER_HOST_LIMIT))
+_HOST_NEXT_START = {}
 
 def create_directories(df):
-    """Create year directories based on dates in CSV"""
-    years = pd.to_datetime(df['Date']).dt.year.unique()
+    """Create year directories based on dates in CSV; returns {year: Path}"""
+    year_dirs = {year: BASE_DIR / str(year) for year in df['Year'].unique()}
     
-    for year in years:
-        year_dir = BASE_DIR / str(year)
+    for year_dir in year_dirs.values():
         year_dir.mkdir(parents=True, exist_ok=True)
     
-    print(f"✓ Created directories for {len(years)} years")
+    print(f"✓ Created directories for {len(year_dirs)} years")
+    return year_dirs
 
-def get_year_from_date(date_str):
-    """Extract year from date string"""
-    return pd.to_datetime(date_str).year
+# Invalid filename characters -> '_' (applied in a single str.translate pass)
+_SANITIZE_TABLE = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
 
 def sanitize_filename(filename):
     """Clean filename to be filesystem-safe"""
-    # Remove or replace invalid characters
-    invalid_chars = '<>:"/\\|?*'
-    for char in invalid_chars:
-        filename = filename.replace(char, '_')
+    # Replace invalid characters
+    filename = filename.translate(_SANITIZE_TABLE)
     
     # Ensure it ends with .pdf
     if not filename.lower().endswith('.pdf'):
@@ -44,65 +80,76 @@ def sanitize_filename(filename):
     
     return filename
 
-def download_pdf(url, dest_path, retry_attempts=3):
+def wait_for_host(host):
+    """Space out request starts on the same host by HOST_MIN_INTERVAL"""
+    with _HOST_LOCK:
+        now = time.monotonic()
+        start = max(now, _HOST_NEXT_START.get(host, 0.0))
+        _HOST_NEXT_START[host] = start + HOST_MIN_INTERVAL
+    if start > now:
+        time.sleep(start - now)
+
+def download_pdf(url, dest_path):
     """
-    Download a single PDF with retry logic
+    Download a single PDF (retries are handled by the session adapter)
     Returns: 'success', 'skipped', or 'failed'
     """
-    # Skip if already exists
-    if dest_path.exists():
-        return 'skipped'
-    
-    for attempt in range(retry_attempts):
-        try:
-            # Add headers to mimic browser
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            response = requests.get(url, timeout=TIMEOUT, headers=headers, stream=True)
-            
+    # Skip if already exists (only complete downloads are ever renamed into place);
+    # a single stat also catches too-small leftovers, which are re-downloaded
+    try:
+        if dest_path.stat().st_size >= MIN_FILE_BYTES:
+            return 'skipped'
+        dest_path.unlink()
+    except FileNotFoundError:
+        pass
+    
+    part_path = dest_path.with_suffix('.pdf.part')
+    try:
+        host = urlparse(url).netloc
+        with _HOST_LOCK:
+            slot = _HOST_SLOTS[host]
+        # Hold one of the host's slots for the whole transfer
+        with slot:
+            wait_for_host(host)
+            response = SESSION.get(url, timeout=TIMEOUT, stream=True)
+        
             if response.status_code == 200:
                 # Check if it's actually a PDF
                 content_type = response.headers.get('content-type', '')
-                
+            
                 # Write to file
-                with open(dest_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                
+                response.raw.decode_content = True  # undo gzip/deflate transfer encoding
+                with open(part_path, 'wb') as f:
+                    if HAS_FADVISE:
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                    shutil.copyfileobj(response.raw, f, length=COPY_BUFFER)
+                    if HAS_FADVISE:
+                        # Nothing re-reads the PDF during the batch; let the kernel drop its pages
+                        f.flush()
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            
                 # Verify file size
-                if dest_path.stat().st_size < 1000:  # Less than 1KB is suspicious
-                    dest_path.unlink()  # Delete suspicious file
+                if part_path.stat().st_size < MIN_FILE_BYTES:  # Less than 1KB is suspicious
+                    part_path.unlink()  # Delete suspicious file
                     return 'failed'
-                
-                return 'success'
             
+                os.replace(part_path, dest_path)
+                return 'success'
+        
             elif response.status_code == 404:
                 return 'not_found'
-            
-            else:
-                if attempt < retry_attempts - 1:
-                    time.sleep(2)  # Wait before retry
-                    continue
-                return 'failed'
-        
-        except requests.Timeout:
-            if attempt < retry_attempts - 1:
-                time.sleep(2)
-                continue
-            return 'timeout'
         
-        except Exception as e:
-            if attempt < retry_attempts - 1:
-                time.sleep(2)
-                continue
             return 'failed'
     
-    return 'failed'
+    except requests.Timeout:
+        part_path.unlink(missing_ok=True)
+        return 'timeout'
+    
+    except Exception as e:
+        part_path.unlink(missing_ok=True)
+        return 'failed'
 
-def download_all_pdfs(df):
+def download_all_pdfs(df, year_dirs):
     """Download all PDFs from the dataframe"""
     
     print("\n" + "="*70)
@@ -118,38 +165,44 @@ def download_all_pdfs(df):
         'timeout': 0
     }
     
-    failed_downloads = []
+    # Preallocated (Filename, URL, Reason) rows plus a write cursor
+    failed_downloads = np.empty((total, 3), dtype=object)
+    n_failed = 0
     
     print(f"\n📥 Starting download of {total} PDFs...")
-    print("   This may take 15-45 minutes depending on file sizes and network speed\n")
+    print(f"   Using {MAX_WORKERS} concurrent downloads\n")
     
-    # Progress bar
-    for idx, row in tqdm(df.iterrows(), total=total, desc="Downloading", unit="file"):
-        date = row['Date']
-        filename = row['Filename']
-        url = row['Download Url']
+    # Resolve destinations up front, then download concurrently
+    jobs = []
+    for row in df.itertuples(index=False, name='Row'):
+        filename = row.Filename
+        url = row.DownloadUrl
         
-        # Get year for directory
-        year = get_year_from_date(date)
-        year_dir = BASE_DIR / str(year)
+        # Year was parsed once for the whole column in main(); directories were created up front
+        year_dir = year_dirs[row.Year]
         
         # Sanitize filename
         safe_filename = sanitize_filename(filename)
         dest_path = year_dir / safe_filename
+        jobs.append((filename, url, dest_path))
+    
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(download_pdf, url, dest_path): (filename, url)
+            for filename, url, dest_path in jobs
+        }
         
-        # Download
-        result = download_pdf(url, dest_path, RETRY_ATTEMPTS)
-        stats[result] += 1
-        
-        if result == 'failed' or result == 'not_found' or result == 'timeout':
-            failed_downloads.append({
-                'Filename': filename,
-                'URL': url,
-                'Reason': result
-            })
-        
-        # Small delay between downloads
-        time.sleep(DELAY_BETWEEN_DOWNLOADS)
+        # Progress bar
+        # Throttle bar redraws: completions arrive in bursts from many worker threads
+        for future in tqdm(as_completed(futures), total=total, desc="Downloading", unit="file",
+                           mininterval=0.5, miniters=max(1, total // 200), smoothing=0.1):
+            filename, url = futures[future]
+            result = future.result()
+            stats[result] += 1
+            
+            if result == 'failed' or result == 'not_found' or result == 'timeout':
+                failed_downloads[n_failed] = (filename, url, result)
+                n_failed += 1
     
     # Summary
     print("\n" + "="*70)
@@ -164,11 +217,11 @@ def download_all_pdfs(df):
     print(f"📊 Total available:          {stats['success'] + stats['skipped']:4d}")
     
     # Save failed downloads log
-    if failed_downloads:
-        failed_df = pd.DataFrame(failed_downloads)
+    if n_failed:
+        failed_df = pd.DataFrame(failed_downloads[:n_failed], columns=['Filename', 'URL', 'Reason'])
         failed_df.to_csv('failed_downloads.csv', index=False)
         print(f"\n⚠️  Failed downloads saved to: failed_downloads.csv")
-        print(f"   You can manually download these {len(failed_downloads)} files later")
+        print(f"   You can manually download these {n_failed} files later")
     
     return stats
 
@@ -185,7 +238,7 @@ def main():
     
     # Load CSV
     print(f"\n📂 Loading: {INPUT_CSV}")
-    df = pd.read_csv(INPUT_CSV)
+    df = pd.read_csv(INPUT_CSV, parse_dates=['Date'])
     print(f"✓ Loaded {len(df)} reports")
     
     # Verify required columns
@@ -194,7 +247,10 @@ def main():
         return
     
     # Show breakdown by year
-    df['Year'] = pd.to_datetime(df['Date']).dt.year
+    # Dates are parsed at load time; the download loop reads row.Year
+    df['Year'] = df['Date'].dt.year.astype('int16')
+    # Attribute-safe column name for itertuples
+    df = df.rename(columns={'Download Url': 'DownloadUrl'})
     year_counts = df['Year'].value_counts().sort_index()
     
     print("\n📊 Reports by year:")
@@ -203,7 +259,7 @@ def main():
     
     # Create directories
     print("\n📁 Creating directories...")
-    create_directories(df)
+    year_dirs = create_directories(df)
     
     # Confirm before downloading
     print("\n⚠️  This will download ~500 PDFs (~2-3 GB total)")
@@ -215,7 +271,7 @@ def main():
         return
     
     # Download all PDFs
-    stats = download_all_pdfs(df)
+    stats = download_all_pdfs(df, year_dirs)
     
     # Final message
     total_available = stats['success'] + stats['skipped']
@@ -5,11 +5,19 @@ Downloads and validates PDFs in real-time, continues until 500 valid PDFs
 
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from tqdm import tqdm
 import time
-from PyPDF2 import PdfReader
+import threading
+from collections import defaultdict
+from urllib.parse import urlparse
+import shutil
+import pypdfium2 as pdfium
 import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
 
 # Configuration
 FULL_CSV = "code/Technical_Report_Collection.csv"
@@ -20,6 +28,35 @@ TARGET_COUNT = 500
 MIN_SIZE_KB = 50
 TIMEOUT = 60
 RANDOM_SEED = 42
+MAX_WORKERS = 16  # concurrent downloads
+PER_HOST_LIMIT = 4  # concurrent downloads allowed against a single host
+HOST_MIN_INTERVAL = 0.3  # seconds between request starts on the same host (be nice to servers)
+RETRY_ATTEMPTS = 3
+TAIL_BYTES = 1024  # bytes read from the end of a PDF to look for the trailer
+COPY_BUFFER = 1 << 20  # bytes copied from the socket to disk per read/write
+
+# PDFs are already compressed; ask for the raw bytes so nothing is inflated client-side
+HEADERS = {'User-Agent': 'Mozilla/5.0', 'Accept-Encoding': 'identity'}
+
+# Shared session: keep-alive connections are reused per host, and the adapter retries failures
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=RETRY_ATTEMPTS,
+        backoff_factor=1,
+        status_forcelist=[502, 503, 504],
+        raise_on_status=False,
+    ),
+)
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+
+_HOST_LOCK = threading.Lock()
+_HOST_SLOTS = defaultdict(lambda: threading.BoundedSemaphore(PER_HOST_LIMIT))
+_HOST_NEXT_START = {}
 
 def check_pdf_valid(pdf_path):
     """Validate PDF file"""
@@ -32,63 +69,84 @@ def check_pdf_valid(pdf_path):
         if file_size_kb < MIN_SIZE_KB:
             return False, f"Too small ({file_size_kb:.1f} KB)"
         
-        reader = PdfReader(str(pdf_path))
-        if len(reader.pages) == 0:
-            return False, "Zero pages"
+        # Cheap structural sniff first: reject files without PDF magic or trailer markers
+        with open(pdf_path, 'rb') as f:
+            head = f.read(8)
+            if not head.startswith(b'%PDF-'):
+                return False, "Bad magic"
+            f.seek(-TAIL_BYTES, os.SEEK_END)
+            tail = f.read()
+        if b'%%EOF' not in tail and b'startxref' not in tail:
+            return False, "Truncated"
         
-        # Try to read first page
-        reader.pages[0].extract_text()
+        # Files that pass the sniff are still parsed (PDFium, native code) before acceptance
+        pdf = pdfium.PdfDocument(str(pdf_path))
+        try:
+            if len(pdf) == 0:
+                return False, "Zero pages"
+        finally:
+            pdf.close()
         
         return True, "Valid"
     
     except Exception as e:
         return False, f"Error: {str(e)[:30]}"
 
+# Invalid filename characters -> '_' (applied in a single str.translate pass)
+_SANITIZE_TABLE = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+
 def sanitize_filename(filename):
     """Clean filename"""
-    invalid_chars = '<>:"/\\|?*'
-    for char in invalid_chars:
-        filename = filename.replace(char, '_')
+    filename = filename.translate(_SANITIZE_TABLE)
     if not filename.lower().endswith('.pdf'):
         filename += '.pdf'
     return filename
 
-def download_and_validate(url, dest_path):
+def wait_for_host(host):
+    """Space out request starts on the same host by HOST_MIN_INTERVAL"""
+    with _HOST_LOCK:
+        now = time.monotonic()
+        start = max(now, _HOST_NEXT_START.get(host, 0.0))
+        _HOST_NEXT_START[host] = start + HOST_MIN_INTERVAL
+    if start > now:
+        time.sleep(start - now)
+
+def download_pdf(url, dest_path):
     """
-    Download PDF and immediately validate
-    Returns: (success, is_valid, message)
+    Download PDF (validation runs separately in a worker process)
+    Returns: (success, message)
     """
+    part_path = dest_path.with_suffix('.pdf.part')
     try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(url, timeout=TIMEOUT, headers=headers, stream=True)
+        host = urlparse(url).netloc
+        with _HOST_LOCK:
+            slot = _HOST_SLOTS[host]
+        # Hold one of the host's slots for the whole transfer
+        with slot:
+            wait_for_host(host)
+            response = SESSION.get(url, timeout=TIMEOUT, stream=True)
         
-        if response.status_code == 404:
-            return False, False, "404 Not Found"
+            if response.status_code == 404:
+                return False, "404 Not Found"
         
-        if response.status_code != 200:
-            return False, False, f"HTTP {response.status_code}"
+            if response.status_code != 200:
+                return False, f"HTTP {response.status_code}"
         
-        # Download file
-        with open(dest_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+            # Download file
+            response.raw.decode_content = True  # undo gzip/deflate transfer encoding
+            with open(part_path, 'wb') as f:
+                shutil.copyfileobj(response.raw, f, length=COPY_BUFFER)
         
-        # Immediately validate
-        is_valid, msg = check_pdf_valid(dest_path)
-        
-        if not is_valid:
-            # Delete invalid file
-            if dest_path.exists():
-                dest_path.unlink()
-            return True, False, msg
-        
-        return True, True, "Valid"
+            # Only complete downloads take the final name, so an interrupted run never leaves a partial PDF
+            os.replace(part_path, dest_path)
+            return True, "Downloaded"
     
     except requests.Timeout:
-        return False, False, "Timeout"
+        part_path.unlink(missing_ok=True)
+        return False, "Timeout"
     except Exception as e:
-        return False, False, f"Error: {str(e)[:30]}"
+        part_path.unlink(missing_ok=True)
+        return False, f"Error: {str(e)[:30]}"
 
 def main():
     print("="*70)
@@ -97,7 +155,7 @@ def main():
     
     # Load current valid PDFs
     print(f"\n📂 Loading current valid dataset...")
-    df_current = pd.read_csv(CURRENT_VALID_CSV)
+    df_current = pd.read_csv(CURRENT_VALID_CSV, parse_dates=['Date'])
     current_count = len(df_current)
     print(f"   ✓ Currently have: {current_count} valid PDFs")
     
@@ -110,21 +168,23 @@ def main():
     
     # Load full dataset
     print(f"\n📂 Loading full dataset...")
-    df_full = pd.read_csv(FULL_CSV)
+    df_full = pd.read_csv(FULL_CSV, parse_dates=['Date'])
     print(f"   ✓ Full dataset: {len(df_full)} reports")
     
     # Exclude already selected files
     print(f"\n🔍 Filtering out already selected reports...")
-    current_filenames = set(df_current['Filename'].values)
+    current_filenames = frozenset(df_current['Filename'])
+    df_full = df_full.drop_duplicates('Filename', keep='first')
+    # Categorical Filename: isin compares the small set of categories, then maps codes
+    df_full['Filename'] = df_full['Filename'].astype('category')
     df_available = df_full[~df_full['Filename'].isin(current_filenames)].copy()
+    df_available['Filename'] = df_available['Filename'].astype(str)
     print(f"   ✓ Available: {len(df_available)} reports")
     
     # Calculate how many we need per year (proportional)
-    df_available['Date'] = pd.to_datetime(df_available['Date'])
-    df_available['Year'] = df_available['Date'].dt.year
-    
-    df_current['Date'] = pd.to_datetime(df_current['Date'])
-    df_current['Year'] = df_current['Date'].dt.year
+    # Dates were parsed at load time, so Year is a plain column operation
+    df_available['Year'] = df_available['Date'].dt.year.astype('int16')
+    df_current['Year'] = df_current['Date'].dt.year.astype('int16')
     
     print(f"\n📊 Current distribution:")
     current_year_counts = df_current['Year'].value_counts().sort_index()
@@ -149,15 +209,16 @@ def main():
         samples = min(int(proportion * select_count), count)
         samples_per_year[year] = samples
     
-    # Sample from each year
-    selected_samples = []
-    for year, n_samples in samples_per_year.items():
-        year_data = df_available[df_available['Year'] == year]
-        sampled = year_data.sample(n=n_samples, random_state=RANDOM_SEED + year)
-        selected_samples.append(sampled)
-    
-    df_candidates = pd.concat(selected_samples, ignore_index=True)
+    # Sample from each year in a single grouped pass
+    df_candidates = (
+        df_available.groupby('Year', group_keys=False)[df_available.columns]
+                    .apply(lambda g: g.sample(n=samples_per_year[g.name],
+                                              random_state=RANDOM_SEED + int(g.name)))
+                    .reset_index(drop=True)
+    )
     df_candidates = df_candidates.sample(frac=1, random_state=RANDOM_SEED).reset_index(drop=True)  # Shuffle
+    # Attribute-safe column name for itertuples (renamed back before saving)
+    df_candidates = df_candidates.rename(columns={'Download Url': 'DownloadUrl'})
     
     print(f"   ✓ Selected {len(df_candidates)} candidates")
     
@@ -166,22 +227,28 @@ def main():
     print(f"   Target: {needed} more valid PDFs")
     print(f"   This will stop automatically when target is reached\n")
     
-    valid_reports = []
-    stats = {'downloaded': 0, 'valid': 0, 'invalid': 0, 'failed': 0}
+    valid_positions = []  # positions into df_candidates; rows are gathered with one iloc at the end
+    stats = {'downloaded': 0, 'valid': 0, 'invalid': 0, 'failed': 0, 'surplus': 0}
+    
+    # Build and create each year directory once instead of per candidate
+    year_paths = {year: BASE_DIR / str(year) for year in df_candidates['Year'].unique()}
+    for year_dir in year_paths.values():
+        year_dir.mkdir(parents=True, exist_ok=True)
     
-    with tqdm(total=needed, desc="Valid PDFs collected", unit="valid") as pbar:
-        for idx, row in df_candidates.iterrows():
-            if len(valid_reports) >= needed:
+    with tqdm(total=needed, desc="Valid PDFs collected", unit="valid",
+              mininterval=0.5, miniters=max(1, needed // 200), smoothing=0.1) as pbar:
+        # Reuse anything already on disk before hitting the network
+        to_download = []
+        for pos, row in enumerate(df_candidates.itertuples(index=False, name='Row')):
+            if len(valid_positions) >= needed:
                 break
             
-            filename = row['Filename']
-            url = row['Download Url']
-            date = row['Date']
-            year = pd.to_datetime(date).year
+            filename = row.Filename
+            url = row.DownloadUrl
+            year = row.Year  # already derived from the parsed Date column
             
             # Prepare destination
-            year_dir = BASE_DIR / str(year)
-            year_dir.mkdir(parents=True, exist_ok=True)
+            year_dir = year_paths[year]
             
             safe_filename = sanitize_filename(filename)
             dest_path = year_dir / safe_filename
@@ -190,36 +257,62 @@ def main():
             if dest_path.exists():
                 is_valid, msg = check_pdf_valid(dest_path)
                 if is_valid:
-                    valid_reports.append(row)
+                    valid_positions.append(pos)
                     stats['valid'] += 1
                     pbar.update(1)
                     continue
             
-            # Download and validate
-            downloaded, is_valid, msg = download_and_validate(url, dest_path)
-            
-            if downloaded:
-                stats['downloaded'] += 1
-                if is_valid:
-                    valid_reports.append(row)
-                    stats['valid'] += 1
-                    pbar.update(1)
-                else:
-                    stats['invalid'] += 1
-            else:
-                stats['failed'] += 1
-            
-            time.sleep(0.3)  # Be nice to servers
+            to_download.append((pos, url, dest_path))
+        
+        # Download concurrently on threads and parse PDFs on worker processes, in waves of
+        # twice the remaining need, so we stop scheduling new candidates once the target is reached.
+        # Results are accepted in candidate order so the selection does not depend on timing
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as downloader, \
+                ProcessPoolExecutor(max_workers=os.cpu_count()) as validator:
+            start = 0
+            while len(valid_positions) < needed and start < len(to_download):
+                wave = to_download[start:start + (needed - len(valid_positions)) * 2]
+                start += len(wave)
+                downloads = [
+                    (pos, dest_path, downloader.submit(download_pdf, url, dest_path))
+                    for pos, url, dest_path in wave
+                ]
+                
+                # Hand each finished download to a validator process
+                validations = []
+                for pos, dest_path, future in downloads:
+                    downloaded, msg = future.result()
+                    if not downloaded:
+                        stats['failed'] += 1
+                        continue
+                    stats['downloaded'] += 1
+                    validations.append((pos, dest_path, validator.submit(check_pdf_valid, dest_path)))
+                
+                for pos, dest_path, future in validations:
+                    is_valid, msg = future.result()
+                    
+                    if is_valid:
+                        if len(valid_positions) >= needed:
+                            stats['surplus'] += 1  # kept on disk for a future run
+                            continue
+                        valid_positions.append(pos)
+                        stats['valid'] += 1
+                        pbar.update(1)
+                    else:
+                        stats['invalid'] += 1
+                        # Delete invalid file
+                        dest_path.unlink(missing_ok=True)
     
     print(f"\n📊 Download Statistics:")
     print(f"   Downloaded: {stats['downloaded']}")
     print(f"   Valid: {stats['valid']}")
     print(f"   Invalid: {stats['invalid']}")
     print(f"   Failed: {stats['failed']}")
+    print(f"   Surplus valid (kept on disk): {stats['surplus']}")
     
     # Combine with current valid PDFs
-    if len(valid_reports) > 0:
-        df_new_valid = pd.DataFrame(valid_reports)
+    if len(valid_positions) > 0:
+        df_new_valid = df_candidates.iloc[valid_positions].rename(columns={'DownloadUrl': 'Download Url'})
         df_new_valid = df_new_valid.drop('Year', axis=1, errors='ignore')
         
         # Combine with existing
@@ -234,7 +327,7 @@ def main():
         
         # Show final distribution
         print(f"\n📊 Final distribution by year:")
-        df_final['Year'] = pd.to_datetime(df_final['Date']).dt.year
+        df_final['Year'] = df_final['Date'].dt.year.astype('int16')
         final_counts = df_final['Year'].value_counts().sort_index()
         
         for year, count in final_counts.items():
@@ -4,6 +4,7 @@ Strategy: Evenly distributed across years to avoid cherry-picking
 """
 
 import pandas as pd
+import numpy as np
 from collections import Counter
 import random
 
@@ -21,7 +22,7 @@ def select_stratified_sample(df, target_count, random_seed=42):
     random.seed(random_seed)
     
     # Extract year from date
-    df['Year'] = pd.to_datetime(df['Date']).dt.year
+    df['Year'] = df['Date'].dt.year.astype('int16')
     
     # Count reports per year
     year_counts = df['Year'].value_counts().sort_index()
@@ -32,39 +33,24 @@ def select_stratified_sample(df, target_count, random_seed=42):
         print(f"  {year}: {count:4d} reports")
     print(f"  {'Total'}: {len(df):4d} reports")
     
-    # Calculate how many to sample from each year (proportional)
-    samples_per_year = {}
+    # Calculate how many to sample from each year (proportional), using
+    # largest-remainder rounding so the total is exactly target_count:
+    # floor everything, then give the leftover units to the biggest fractional parts
     total_reports = len(df)
-    
-    for year, count in year_counts.items():
-        # Proportional sampling
-        proportion = count / total_reports
-        samples = round(proportion * target_count)
-        samples_per_year[year] = min(samples, count)  # Can't sample more than available
-    
-    # Adjust if total doesn't equal target (due to rounding)
-    total_samples = sum(samples_per_year.values())
-    if total_samples < target_count:
-        # Add missing samples to years with most reports
-        diff = target_count - total_samples
-        sorted_years = sorted(year_counts.items(), key=lambda x: x[1], reverse=True)
-        for year, count in sorted_years:
-            if diff == 0:
-                break
-            if samples_per_year[year] < count:
-                samples_per_year[year] += 1
-                diff -= 1
-    
-    elif total_samples > target_count:
-        # Remove extra samples from years with most samples
-        diff = total_samples - target_count
-        sorted_years = sorted(samples_per_year.items(), key=lambda x: x[1], reverse=True)
-        for year, _ in sorted_years:
-            if diff == 0:
-                break
-            if samples_per_year[year] > 1:
-                samples_per_year[year] -= 1
-                diff -= 1
+    raw = year_counts.values / total_reports * target_count
+    floor = np.floor(raw).astype(int)
+    leftover = target_count - floor.sum()
+    order = np.argsort(floor - raw, kind='stable')
+    floor[order[:leftover]] += 1
+    # Can't sample more than available: hand capped units to years that still have rows
+    available = year_counts.values
+    samples = np.minimum(floor, available)
+    shortfall = min(target_count, available.sum()) - samples.sum()
+    while shortfall > 0:
+        open_years = order[samples[order] < available[order]][:shortfall]
+        samples[open_years] += 1
+        shortfall -= len(open_years)
+    samples_per_year = dict(zip(year_counts.index, samples))
     
     print("\n🎯 Target Distribution (Proportional Sampling):")
     print("="*50)
@@ -72,18 +58,12 @@ def select_stratified_sample(df, target_count, random_seed=42):
         print(f"  {year}: {samples_per_year[year]:4d} reports")
     print(f"  {'Total'}: {sum(samples_per_year.values()):4d} reports")
     
-    # Sample from each year
-    selected_samples = []
-    
-    for year, n_samples in samples_per_year.items():
-        year_data = df[df['Year'] == year]
-        
-        # Random sample without replacement
-        sampled = year_data.sample(n=n_samples, random_state=random_seed + year)
-        selected_samples.append(sampled)
-    
-    # Combine all samples
-    result_df = pd.concat(selected_samples, ignore_index=True)
+    # Sample from each year in a single grouped pass (random sample without replacement)
+    result_df = (
+        df.groupby('Year', group_keys=False)[df.columns]
+          .apply(lambda g: g.sample(n=samples_per_year[g.name],
+                                    random_state=random_seed + int(g.name)))
+    )
     
     # Sort by date
     result_df = result_df.sort_values('Date').reset_index(drop=True)
@@ -102,7 +82,7 @@ def main():
     print(f"\n📂 Loading: {INPUT_CSV}")
     
     try:
-        df = pd.read_csv(INPUT_CSV)
+        df = pd.read_csv(INPUT_CSV, parse_dates=['Date'])
     except FileNotFoundError:
         print(f"❌ Error: {INPUT_CSV} not found!")
         return
@@ -4,63 +4,222 @@ Identifies corrupted/invalid PDFs and updates CSV with only valid reports
 """
 
 import os
+import argparse
+from functools import partial
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from PyPDF2 import PdfReader
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 # Configuration
 INPUT_CSV = "ArticlesDataset_500_Valid.csv"
 OUTPUT_CSV = "ArticlesDataset_500_valid_final.csv"
 BASE_DIR = Path("Reports/APT_CyberCriminal_Campagin_Collections Reports")
 MIN_SIZE_KB = 50  # Flag files smaller than 50KB as suspicious
+MIN_SIZE_BYTES = MIN_SIZE_KB * 1024
+DATE_FORMAT = "%Y-%m-%d"
+TAIL_BYTES = 1024  # '%%EOF' must appear within the last 1KB
+HAS_PREAD = hasattr(os, 'pread')  # Not available on Windows
+HAS_FADVISE = hasattr(os, 'posix_fadvise')
+IO_QUEUE_DEPTH = 32  # Header/trailer reads kept in flight by the fast check
 
-def check_pdf_valid(pdf_path):
+# Bound by _init_worker, only needed when PDFs are parsed
+_pdfium = None
+_PdfReader = None
+
+def _init_worker(use_pypdf2=False):
+    """Import the deep-check PDF library once per worker process"""
+    global _pdfium, _PdfReader
+    if use_pypdf2:
+        from PyPDF2 import PdfReader as _PdfReader
+    else:
+        import pypdfium2 as _pdfium
+
+def _deep_check_pdfium(pdf_path):
+    """
+    Parse the PDF with PDFium (C++) and extract text from the first page
+    Returns: error message, or None if readable
+    """
+    if _pdfium is None:
+        _init_worker()
+    try:
+        pdf = _pdfium.PdfDocument(str(pdf_path))
+    except _pdfium.PdfiumError as e:
+        return f"PDF read error: {str(e)[:50]}"
+    try:
+        if len(pdf) == 0:
+            return "Zero pages"
+        
+        # Try to extract text from first page (ensure it's readable)
+        page = pdf[0]
+        textpage = page.get_textpage()
+        textpage.get_text_bounded()
+        textpage.close()
+        page.close()
+        return None
+    except _pdfium.PdfiumError as e:
+        return f"PDF read error: {str(e)[:50]}"
+    finally:
+        pdf.close()
+
+def read_header_tail(pdf_path, size_bytes):
+    """
+    Read the first 8 bytes and the last TAIL_BYTES of a file
+    Uses two positioned reads on one descriptor where os.pread exists;
+    the trailer read is hinted first so both can be serviced together
+    Returns: (header, tail)
+    """
+    tail_offset = max(0, size_bytes - TAIL_BYTES)
+    if not HAS_PREAD:
+        with open(pdf_path, 'rb') as f:
+            header = f.read(8)
+            f.seek(tail_offset)
+            return header, f.read(TAIL_BYTES)
+    
+    fd = os.open(pdf_path, os.O_RDONLY)
+    try:
+        if HAS_FADVISE:
+            os.posix_fadvise(fd, tail_offset, TAIL_BYTES, os.POSIX_FADV_WILLNEED)
+        return os.pread(fd, 8, 0), os.pread(fd, TAIL_BYTES, tail_offset)
+    finally:
+        os.close(fd)
+
+def check_pdf_valid(pdf_path, deep=True, size_bytes=None, use_pypdf2=False):
     """
     Check if PDF is valid and readable
-    Returns: (is_valid, file_size_kb, error_message)
+    Cheap check first: size, '%PDF-' header and '%%EOF' trailer reject obvious failures
+    Files that pass are parsed with PDFium (or PyPDF2 if use_pypdf2);
+    deep=False stops after the cheap check
+    size_bytes: size already known from a directory scan (skips the stat call)
+    Returns: (is_valid, file_size_bytes, error_message)
     """
     try:
-        # Check if file exists
-        if not pdf_path.exists():
-            return False, 0, "File not found"
+        # One stat call for existence and size
+        if size_bytes is None:
+            try:
+                size_bytes = os.stat(pdf_path).st_size
+            except FileNotFoundError:
+                return False, 0, "File not found"
+        if size_bytes < MIN_SIZE_BYTES:
+            return False, size_bytes, f"Too small ({size_bytes / 1024:.1f} KB)"
+        
+        # Sniff header and trailer bytes to reject before parsing the whole file
+        header, tail = read_header_tail(pdf_path, size_bytes)
         
-        # Check file size
-        file_size = pdf_path.stat().st_size / 1024  # Convert to KB
+        if not header.startswith(b'%PDF-'):
+            return False, size_bytes, "Missing PDF header"
+        if b'%%EOF' not in tail:
+            return False, size_bytes, "Missing EOF marker"
         
-        if file_size < MIN_SIZE_KB:
-            return False, file_size, f"Too small ({file_size:.1f} KB)"
+        if not deep:
+            return True, size_bytes, None
+        
+        if not use_pypdf2:
+            error_msg = _deep_check_pdfium(pdf_path)
+            return error_msg is None, size_bytes, error_msg
         
         # Try to read the PDF
         try:
-            reader = PdfReader(str(pdf_path))
+            if _PdfReader is None:
+                _init_worker(use_pypdf2=True)
+            reader = _PdfReader(str(pdf_path))
             num_pages = len(reader.pages)
             
             if num_pages == 0:
-                return False, file_size, "Zero pages"
+                return False, size_bytes, "Zero pages"
             
             # Try to extract text from first page (ensure it's readable)
             first_page = reader.pages[0]
             text = first_page.extract_text()
             
-            return True, file_size, None
+            return True, size_bytes, None
             
         except Exception as e:
-            return False, file_size, f"PDF read error: {str(e)[:50]}"
+            return False, size_bytes, f"PDF read error: {str(e)[:50]}"
     
     except Exception as e:
         return False, 0, f"System error: {str(e)[:50]}"
 
+_SANITIZE_TABLE = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+
 def sanitize_filename(filename):
     """Clean filename to be filesystem-safe"""
-    invalid_chars = '<>:"/\\|?*'
-    for char in invalid_chars:
-        filename = filename.replace(char, '_')
+    filename = filename.translate(_SANITIZE_TABLE)
     if not filename.lower().endswith('.pdf'):
         filename += '.pdf'
     return filename
 
+def build_file_index(year_dirs):
+    """
+    Scan each year directory once
+    year_dirs: {year: directory}
+    Returns: {(year, filename): size_bytes}
+    """
+    index = {}
+    for year, year_dir in year_dirs.items():
+        try:
+            with os.scandir(year_dir) as it:
+                for entry in it:
+                    if entry.is_file(follow_symlinks=False):
+                        index[(year, entry.name)] = entry.stat(follow_symlinks=False).st_size
+        except FileNotFoundError:
+            continue
+    return index
+
+def delete_files(paths):
+    """
+    Delete files, unlinking relative to one open handle per directory where supported
+    Returns: number of files deleted
+    """
+    by_dir = {}
+    for p in paths:
+        parent, name = os.path.split(p)
+        by_dir.setdefault(parent, []).append(name)
+    
+    use_dir_fd = os.unlink in os.supports_dir_fd
+    deleted_count = 0
+    for parent, names in by_dir.items():
+        try:
+            dir_fd = os.open(parent, os.O_RDONLY) if use_dir_fd else None
+        except FileNotFoundError:
+            continue
+        try:
+            for name in names:
+                try:
+                    if dir_fd is None:
+                        os.unlink(os.path.join(parent, name))
+                    else:
+                        os.unlink(name, dir_fd=dir_fd)
+                    deleted_count += 1
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"   ⚠️  Could not delete {name}: {e}")
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
+    return deleted_count
+
+def _validate_row(task, deep=True, use_pypdf2=False):
+    """
+    Worker: validate the PDF for one CSV row
+    task: (pdf_path, size_bytes), size_bytes is None if the file is missing
+    Returns: (is_valid, file_size_bytes, error_message)
+    """
+    pdf_path, size_bytes = task
+    if size_bytes is None:
+        return False, 0, "File not found"
+    return check_pdf_valid(pdf_path, deep, size_bytes, use_pypdf2)
+
 def main():
+    parser = argparse.ArgumentParser(description='Validate downloaded PDFs and clean the dataset')
+    parser.add_argument('--sniff-only', action='store_true',
+                        help='Only check the PDF header and trailer bytes without parsing (fast, misses corrupted bodies)')
+    parser.add_argument('--pypdf2', action='store_true',
+                        help='Use PyPDF2 instead of PDFium to parse the PDFs')
+    args = parser.parse_args()
+    
     print("="*70)
     print("PDF Validation and Dataset Cleaning")
     print("="*70)
@@ -74,39 +233,56 @@ def main():
     df = pd.read_csv(INPUT_CSV)
     print(f"✓ Loaded {len(df)} reports")
     
-    # Prepare validation results
-    validation_results = []
+    # Year directory and filesystem-safe name for every row, computed column-wise
+    years = pd.to_datetime(df['Date'], format=DATE_FORMAT, cache=True).dt.year.tolist()
+    safe_names = df['Filename'].str.translate(_SANITIZE_TABLE)
+    missing_ext = ~safe_names.str.lower().str.endswith('.pdf')
+    safe_names[missing_ext] = safe_names[missing_ext] + '.pdf'
+    year_dirs = {y: BASE_DIR / str(y) for y in set(years)}
+    paths = [year_dirs[y] / n for y, n in zip(years, safe_names)]
+    
+    # One directory scan per year instead of a stat per file
+    file_index = build_file_index(year_dirs)
+    sizes = [file_index.get(key) for key in zip(years, safe_names)]
     
     print("\n🔍 Validating PDFs...")
     print("   This may take a few minutes...\n")
     
-    for idx, row in tqdm(df.iterrows(), total=len(df), desc="Validating", unit="file"):
-        date = row['Date']
-        filename = row['Filename']
-        
-        # Get year for directory
-        year = pd.to_datetime(date).year
-        year_dir = BASE_DIR / str(year)
-        
-        # Sanitize filename
-        safe_filename = sanitize_filename(filename)
-        pdf_path = year_dir / safe_filename
-        
-        # Check if valid
-        is_valid, file_size, error_msg = check_pdf_valid(pdf_path)
-        
-        validation_results.append({
-            'index': idx,
-            'filename': filename,
-            'year': year,
-            'is_valid': is_valid,
-            'file_size_kb': file_size,
-            'error': error_msg,
-            'path': str(pdf_path)
-        })
+    # Full parsing is CPU-bound and goes to worker processes;
+    # the header sniff alone (--sniff-only) is I/O-bound, so threads overlap the reads
+    deep = not args.sniff_only
+    tasks = list(zip(paths, sizes))
+    
+    # Prepare validation results as one array per column
+    n = len(df)
+    is_valid = np.empty(n, dtype=bool)
+    file_size_bytes = np.empty(n, dtype=np.int64)
+    errors = np.empty(n, dtype=object)
+    if deep:
+        executor = ProcessPoolExecutor(max_workers=min(os.cpu_count(), 8),
+                                       initializer=_init_worker, initargs=(args.pypdf2,))
+    else:
+        executor = ThreadPoolExecutor(max_workers=IO_QUEUE_DEPTH)
+    with executor:
+        results = executor.map(partial(_validate_row, deep=deep, use_pypdf2=args.pypdf2), tasks, chunksize=16)
+        for i, (valid, size_bytes, error_msg) in enumerate(
+                tqdm(results, total=n, desc="Validating", unit="file",
+                     mininterval=0.25, miniters=max(1, n // 200))):
+            is_valid[i] = valid
+            file_size_bytes[i] = size_bytes
+            errors[i] = error_msg
     
     # Create results DataFrame
-    results_df = pd.DataFrame(validation_results)
+    results_df = pd.DataFrame({
+        'index': np.arange(n),
+        'filename': df['Filename'].to_numpy(),
+        'year': years,
+        'is_valid': is_valid,
+        'file_size_kb': file_size_bytes / 1024,
+        'error': errors,
+        'path': [str(p) for p in paths]
+    })
+    invalid_df = results_df.loc[~is_valid]
     
     # Statistics
     print("\n" + "="*70)
@@ -114,7 +290,7 @@ def main():
     print("="*70)
     
     total_files = len(results_df)
-    valid_files = results_df['is_valid'].sum()
+    valid_files = int(is_valid.sum())
     invalid_files = total_files - valid_files
     
     print(f"\n📊 Overall Statistics:")
@@ -128,41 +304,32 @@ def main():
         print(f"\n⚠️  Invalid Files Breakdown:")
         
         # Group by error type
-        invalid_df = results_df[~results_df['is_valid']]
-        
         # Count by error type
-        error_counts = {}
-        for error in invalid_df['error']:
-            if 'Too small' in str(error):
-                error_type = 'Too small (< 50KB)'
-            elif 'not found' in str(error):
-                error_type = 'File not found'
-            elif 'PDF read error' in str(error):
-                error_type = 'Corrupted PDF'
-            elif 'Zero pages' in str(error):
-                error_type = 'Empty PDF'
-            else:
-                error_type = 'Other error'
-            
-            error_counts[error_type] = error_counts.get(error_type, 0) + 1
+        errors_str = invalid_df['error'].fillna('').astype(str)
+        error_types = np.select(
+            [errors_str.str.contains('Too small', regex=False),
+             errors_str.str.contains('not found', regex=False),
+             errors_str.str.contains('PDF read error|Missing PDF header|Missing EOF marker'),
+             errors_str.str.contains('Zero pages', regex=False)],
+            ['Too small (< 50KB)', 'File not found', 'Corrupted PDF', 'Empty PDF'],
+            default='Other error'
+        )
+        error_counts = pd.Series(error_types).value_counts()
         
-        for error_type, count in sorted(error_counts.items(), key=lambda x: x[1], reverse=True):
+        for error_type, count in error_counts.items():
             print(f"      • {error_type}: {count}")
     
     # Year-by-year breakdown
     print(f"\n📅 Valid PDFs by Year:")
-    year_stats = results_df.groupby('year').agg({
-        'is_valid': ['count', 'sum']
-    })
-    year_stats.columns = ['Total', 'Valid']
+    year_stats = results_df.groupby('year', sort=False)['is_valid'].agg(Total='count', Valid='sum')
     year_stats['Invalid'] = year_stats['Total'] - year_stats['Valid']
+    year_stats = year_stats.sort_index()
     
     for year, row in year_stats.iterrows():
         print(f"   {year}: {int(row['Valid'])}/{int(row['Total'])} valid ({int(row['Valid'])/int(row['Total'])*100:.1f}%)")
     
     # Create cleaned dataset with only valid PDFs
-    valid_indices = results_df[results_df['is_valid']]['index'].tolist()
-    df_cleaned = df.iloc[valid_indices].reset_index(drop=True)
+    df_cleaned = df.loc[is_valid].reset_index(drop=True)
     
     # Save cleaned CSV
     print(f"\n💾 Saving cleaned dataset...")
@@ -172,8 +339,7 @@ def main():
     
     # Save invalid files list for reference
     if invalid_files > 0:
-        invalid_df = results_df[~results_df['is_valid']][['filename', 'year', 'file_size_kb', 'error']]
-        invalid_df.to_csv('invalid_pdfs.csv', index=False)
+        invalid_df[['filename', 'year', 'file_size_kb', 'error']].to_csv('invalid_pdfs.csv', index=False)
         print(f"   ✓ Saved invalid list: invalid_pdfs.csv")
     
     # Delete corrupted files (optional)
@@ -182,15 +348,8 @@ def main():
     response = input("   Delete invalid PDFs? (y/n): ").strip().lower()
     
     if response == 'y':
-        deleted_count = 0
-        for _, row in results_df[~results_df['is_valid']].iterrows():
-            pdf_path = Path(row['path'])
-            if pdf_path.exists():
-                try:
-                    pdf_path.unlink()
-                    deleted_count += 1
-                except Exception as e:
-                    print(f"   ⚠️  Could not delete {pdf_path.name}: {e}")
+        bad_paths = invalid_df['path'].tolist()
+        deleted_count = delete_files(bad_paths)
         
         print(f"   ✓ Deleted {deleted_count} invalid files")
     else:
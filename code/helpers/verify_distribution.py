@@ -4,8 +4,10 @@ Compares original 1509 reports vs selected 500 to ensure proper stratification
 """
 
 import argparse
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+
+DATE_FORMAT = "%Y-%m-%d"
 
 parser = argparse.ArgumentParser(description="Verify temporal distribution of selected reports.")
 parser.add_argument(
@@ -18,6 +20,11 @@ parser.add_argument(
     default="ArticlesDataset_500_Valid.csv",
     help="CSV containing the sampled dataset to validate (default: ArticlesDataset_500_Valid.csv)",
 )
+parser.add_argument(
+    "--no-plot",
+    action="store_true",
+    help="Skip rendering distribution_verification.png (faster for batch runs)",
+)
 args = parser.parse_args()
 
 # Load both datasets
@@ -30,12 +37,12 @@ print("="*70)
 
 # Load original dataset
 df_original = pd.read_csv(original_csv)
-df_original['Date'] = pd.to_datetime(df_original['Date'])
+df_original['Date'] = pd.to_datetime(df_original['Date'], format=DATE_FORMAT, cache=True)
 df_original['Year'] = df_original['Date'].dt.year
 
 # Load selected dataset
 df_selected = pd.read_csv(selected_csv)
-df_selected['Date'] = pd.to_datetime(df_selected['Date'])
+df_selected['Date'] = pd.to_datetime(df_selected['Date'], format=DATE_FORMAT, cache=True)
 df_selected['Year'] = df_selected['Date'].dt.year
 
 print(f"\n📊 Original Dataset: {len(df_original)} reports")
@@ -55,20 +62,18 @@ print("-"*70)
 total_original = len(df_original)
 total_selected = len(df_selected)
 
-for year in sorted(original_counts.index):
-    orig_count = original_counts[year]
-    sel_count = selected_counts.get(year, 0)
-    
-    # Calculate expected count (proportional)
-    expected = (orig_count / total_original) * total_selected
-    
-    # Calculate difference
-    difference = sel_count - expected
-    
-    # Calculate percentage error
-    pct_error = (difference / expected) * 100 if expected > 0 else 0
-    
-    print(f"{year:<6} {orig_count:>10} {sel_count:>10} {expected:>10.1f} {difference:>12.1f} {pct_error:>9.1f}%")
+# Expected count (proportional), difference and percentage error for every year at once
+years_idx = original_counts.index
+orig = original_counts.to_numpy()
+sel = selected_counts.reindex(years_idx, fill_value=0).to_numpy()
+expected = orig / total_original * total_selected
+diff = sel - expected
+with np.errstate(divide='ignore', invalid='ignore'):
+    pct_err = np.where(expected > 0, diff / expected * 100, 0.0)
+
+for year, orig_count, sel_count, expected_count, difference, pct_error in zip(
+        years_idx, orig, sel, expected, diff, pct_err):
+    print(f"{year:<6} {orig_count:>10} {sel_count:>10} {expected_count:>10.1f} {difference:>12.1f} {pct_error:>9.1f}%")
 
 # Overall statistics
 print("\n" + "="*70)
@@ -78,11 +83,7 @@ print("="*70)
 # Calculate chi-square test for goodness of fit
 from scipy import stats
 
-expected_counts = [(original_counts[year] / total_original) * total_selected 
-                   for year in original_counts.index]
-observed_counts = [selected_counts.get(year, 0) for year in original_counts.index]
-
-chi2, p_value = stats.chisquare(observed_counts, expected_counts)
+chi2, p_value = stats.chisquare(sel, expected)
 
 print(f"\nChi-Square Test:")
 print(f"  χ² statistic: {chi2:.4f}")
@@ -96,16 +97,10 @@ else:
     print(f"     May need to re-run selection")
 
 # Calculate max deviation
-max_dev_year = None
-max_dev_pct = 0
-for year in original_counts.index:
-    orig_count = original_counts[year]
-    sel_count = selected_counts.get(year, 0)
-    expected = (orig_count / total_original) * total_selected
-    dev_pct = abs((sel_count - expected) / expected * 100) if expected > 0 else 0
-    if dev_pct > max_dev_pct:
-        max_dev_pct = dev_pct
-        max_dev_year = year
+abs_pct_err = np.abs(pct_err)
+max_pos = int(np.argmax(abs_pct_err))
+max_dev_pct = abs_pct_err[max_pos]
+max_dev_year = years_idx[max_pos]
 
 print(f"\nMaximum Deviation:")
 print(f"  Year {max_dev_year}: {max_dev_pct:.1f}% off from expected")
@@ -117,48 +112,50 @@ elif max_dev_pct < 20:
 else:
     print(f"  ❌ Some years >20% off expected (poor distribution)")
 
-# Visual comparison
-print("\n" + "="*70)
-print("Creating distribution comparison chart...")
-print("="*70)
-
-fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
-
-# Plot 1: Absolute counts
-years = sorted(original_counts.index)
-x = range(len(years))
-
-ax1.bar([i-0.2 for i in x], [original_counts[y] for y in years], 
-        width=0.4, label='Original (1509)', color='#2E86AB', alpha=0.8)
-ax1.bar([i+0.2 for i in x], [selected_counts.get(y, 0) for y in years], 
-        width=0.4, label='Selected (500)', color='#A23B72', alpha=0.8)
-
-ax1.set_xlabel('Year', fontsize=12, fontweight='bold')
-ax1.set_ylabel('Number of Reports', fontsize=12, fontweight='bold')
-ax1.set_title('Absolute Distribution Comparison', fontsize=14, fontweight='bold')
-ax1.set_xticks(x)
-ax1.set_xticklabels(years, rotation=45)
-ax1.legend()
-ax1.grid(True, alpha=0.3)
-
-# Plot 2: Percentage distribution
-orig_pct = [(original_counts[y] / total_original * 100) for y in years]
-sel_pct = [(selected_counts.get(y, 0) / total_selected * 100) for y in years]
-
-ax2.plot(years, orig_pct, marker='o', linewidth=2, markersize=8, 
-         label='Original %', color='#2E86AB')
-ax2.plot(years, sel_pct, marker='s', linewidth=2, markersize=8, 
-         label='Selected %', color='#A23B72')
-
-ax2.set_xlabel('Year', fontsize=12, fontweight='bold')
-ax2.set_ylabel('Percentage of Total (%)', fontsize=12, fontweight='bold')
-ax2.set_title('Percentage Distribution Comparison', fontsize=14, fontweight='bold')
-ax2.legend()
-ax2.grid(True, alpha=0.3)
-
-plt.tight_layout()
-plt.savefig('distribution_verification.png', dpi=300, bbox_inches='tight')
-print("✓ Saved: distribution_verification.png")
+# Visual comparison (matplotlib is only imported when the chart is requested)
+if not args.no_plot:
+    print("\n" + "="*70)
+    print("Creating distribution comparison chart...")
+    print("="*70)
+
+    import matplotlib.pyplot as plt
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
+
+    # Plot 1: Absolute counts
+    years = sorted(original_counts.index)
+    x = range(len(years))
+
+    ax1.bar([i-0.2 for i in x], [original_counts[y] for y in years], 
+            width=0.4, label='Original (1509)', color='#2E86AB', alpha=0.8)
+    ax1.bar([i+0.2 for i in x], [selected_counts.get(y, 0) for y in years], 
+            width=0.4, label='Selected (500)', color='#A23B72', alpha=0.8)
+
+    ax1.set_xlabel('Year', fontsize=12, fontweight='bold')
+    ax1.set_ylabel('Number of Reports', fontsize=12, fontweight='bold')
+    ax1.set_title('Absolute Distribution Comparison', fontsize=14, fontweight='bold')
+    ax1.set_xticks(x)
+    ax1.set_xticklabels(years, rotation=45)
+    ax1.legend()
+    ax1.grid(True, alpha=0.3)
+
+    # Plot 2: Percentage distribution
+    orig_pct = [(original_counts[y] / total_original * 100) for y in years]
+    sel_pct = [(selected_counts.get(y, 0) / total_selected * 100) for y in years]
+
+    ax2.plot(years, orig_pct, marker='o', linewidth=2, markersize=8, 
+             label='Original %', color='#2E86AB')
+    ax2.plot(years, sel_pct, marker='s', linewidth=2, markersize=8, 
+             label='Selected %', color='#A23B72')
+
+    ax2.set_xlabel('Year', fontsize=12, fontweight='bold')
+    ax2.set_ylabel('Percentage of Total (%)', fontsize=12, fontweight='bold')
+    ax2.set_title('Percentage Distribution Comparison', fontsize=14, fontweight='bold')
+    ax2.legend()
+    ax2.grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig('distribution_verification.png', dpi=300, bbox_inches='tight')
+    print("✓ Saved: distribution_verification.png")
 
 # Summary verdict
 print("\n" + "="*70)
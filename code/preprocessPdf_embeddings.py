@@ -1,10 +1,20 @@
+import asyncio
+import bisect
+import hashlib
+import json
 import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import faiss
+import numpy as np
 import pandas as pd
+import pypdfium2 as pdfium
 from tqdm import tqdm
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from dotenv import load_dotenv
@@ -14,61 +24,314 @@ load_dotenv()
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 REPORTS_DIR = PROJECT_ROOT / "Reports" / "APT_CyberCriminal_Campagin_Collections Reports"
 VECTORSTORE_DIR = PROJECT_ROOT / "vectorstore_gemini_embeddings"
+SPLITS_CACHE_DIR = VECTORSTORE_DIR / "_splits_cache"
+COMBINED_DIR = VECTORSTORE_DIR / "combined"
+MANIFEST_FILE = VECTORSTORE_DIR / "_manifest.json"
 CSV_FILE = PROJECT_ROOT / "ArticlesDataset_500_Valid.csv"
 if not CSV_FILE.exists():
     CSV_FILE = PROJECT_ROOT / "code" / "ArticlesDataset_500_Valid.csv"
 EMBEDDING_MODEL = "text-embedding-004"
 API_KEY = os.environ["GOOGLE_API_KEY"]
+MAX_WORKERS = os.cpu_count()  # PDFs parsed concurrently (PDFium is not thread-safe, so processes)
+CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 200
+BREAK_RE = re.compile(r"\n\n|(?<=[.!?])\s")
+EMBED_BATCH_SIZE = 100  # text-embedding-004 accepts up to 100 texts per request
+EMBED_CONCURRENCY = 32  # Embedding requests in flight at once
+HNSW_M = 32  # Graph neighbours per node
+HNSW_EF_CONSTRUCTION = 200
+MANIFEST_FLUSH_EVERY = 10  # Rewrite the manifest after this many newly saved stores
 
+def index_reports() -> dict:
+    # {year: {pdf stem, ...}} for every year directory under REPORTS_DIR
+    year_files = {}
+    if not REPORTS_DIR.is_dir():
+        return year_files
+    for year_dir in os.scandir(REPORTS_DIR):
+        if year_dir.is_dir() and year_dir.name.isdigit():
+            year_files[int(year_dir.name)] = {
+                entry.name[:-4] for entry in os.scandir(year_dir.path)
+                if entry.name.endswith(".pdf") and entry.is_file()
+            }
+    return year_files
 
-def vectorize_pdf(pdf_path: Path, db_faiss_path: Path, api_key: str) -> None:
-    loader = PyPDFLoader(str(pdf_path))
 
-    docs = loader.load()
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-    splits = text_splitter.split_documents(docs)
+def is_vectorized(db_faiss_path: Path) -> bool:
+    return (db_faiss_path / "index.faiss").exists() and (db_faiss_path / "index.pkl").exists()
 
+
+def load_manifest() -> set:
+    # Stems whose store was fully saved; written only after save_local returns
+    if not MANIFEST_FILE.exists():
+        return set()
+    with open(MANIFEST_FILE, encoding="utf-8") as f:
+        return set(json.load(f))
+
+
+def save_manifest(done: set) -> None:
+    VECTORSTORE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_FILE.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(sorted(done), f)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+
+def pack_chunks(breaks: list, n: int, size: int, overlap: int) -> tuple:
+    # Greedy packing over sorted break offsets; only integer offsets are touched, never the text
+    starts = []
+    ends = []
+    start = 0
+    prev_end = 0
+    while start < n:
+        limit = start + size
+        if limit >= n:
+            end = n
+        else:
+            # A break only counts if it moves past the previous chunk's end; otherwise
+            # (a breakless run such as an IOC table) hard-cut at the size limit
+            k = bisect.bisect_right(breaks, limit) - 1
+            end = breaks[k] if k >= 0 and breaks[k] > max(start, prev_end) else limit
+        starts.append(start)
+        ends.append(end)
+        if end >= n:
+            break
+
+        # Start the next chunk at the first break inside the overlap window
+        k = bisect.bisect_left(breaks, end - overlap)
+        next_start = breaks[k] if k < len(breaks) and breaks[k] < end else end - overlap
+        start = max(next_start, start + 1)
+        prev_end = end
+    return starts, ends
+
+
+def fast_split(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list:
+    # One regex pass finds paragraph/sentence breaks; chunks are then packed greedily up to size
+    breaks = [m.end() for m in BREAK_RE.finditer(text)]
+    starts, ends = pack_chunks(breaks, len(text), size, overlap)
+    chunks = (text[s:e].strip() for s, e in zip(starts, ends))
+    return [chunk for chunk in chunks if chunk]
+
+
+def load_pdf(pdf_path: Path) -> list:
+    # PDFium (C++) text extraction, one Document per page like PyPDFLoader.
+    # The file is read in one sequential pass instead of PDFium seeking around it.
+    pdf = pdfium.PdfDocument(pdf_path.read_bytes())
     try:
-        embeddings = GoogleGenerativeAIEmbeddings(
-            model=EMBEDDING_MODEL,
-            google_api_key=api_key,
-        )
-        vectorstore = FAISS.from_documents(documents=splits, embedding=embeddings)
-        db_faiss_path.mkdir(parents=True, exist_ok=True)
-        vectorstore.save_local(str(db_faiss_path))
-    except IndexError:
-        pdf_file = pdf_path.stem
-        df = pd.read_csv(CSV_FILE)
-        df = df.drop(df.loc[(df["Filename"] == pdf_file)].index)
-        print(f"\nArticle {pdf_file} was deleted from dataset")
-        df.to_csv(CSV_FILE, index=False)
-        main()
-    except RuntimeError as e:
-        print("\n", e)
-        print(f"\n{pdf_path}")
-        exit()
+        docs = []
+        for i, page in enumerate(pdf):
+            textpage = page.get_textpage()
+            docs.append(Document(
+                page_content=textpage.get_text_bounded(),
+                metadata={"source": str(pdf_path), "page": i},
+            ))
+            textpage.close()
+            page.close()
+        return docs
+    finally:
+        pdf.close()
+
+
+def split_documents(docs: list) -> list:
+    return [
+        Document(page_content=chunk, metadata=doc.metadata)
+        for doc in docs
+        for chunk in fast_split(doc.page_content)
+    ]
+
+
+def splits_cache_path(pdf_path: Path) -> Path:
+    # The key changes whenever the PDF or the chunking parameters change
+    key = f"{pdf_path}:{pdf_path.stat().st_mtime_ns}:{CHUNK_SIZE}:{CHUNK_OVERLAP}:offset:pdfium"
+    return SPLITS_CACHE_DIR / f"{hashlib.sha1(key.encode()).hexdigest()}.parquet"
+
+
+def load_splits(pdf_path: Path) -> list:
+    cache_path = splits_cache_path(pdf_path)
+    if cache_path.exists():
+        cached = pd.read_parquet(cache_path)
+        return [
+            Document(page_content=text, metadata=json.loads(meta))
+            for text, meta in zip(cached["text"], cached["meta"])
+        ]
+
+    docs = load_pdf(pdf_path)
+    splits = split_documents(docs)
+
+    SPLITS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame({
+        "text": [doc.page_content for doc in splits],
+        "meta": [json.dumps(doc.metadata, default=str) for doc in splits],
+    }).to_parquet(cache_path, index=False)
+    return splits
+
+
+def build_index(matrix: np.ndarray):
+    # HNSW graph instead of the default flat index: sublinear search and no flat-array regrowth on merge.
+    # Vectors are stored as 8-bit scalar-quantized codes, a quarter of the float32 size.
+    index = faiss.IndexHNSWSQ(matrix.shape[1], faiss.ScalarQuantizer.QT_8bit, HNSW_M)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.train(matrix)
+    index.add(matrix)
+    return index
+
+
+def save_vectorstore(splits: list, matrix: np.ndarray, db_faiss_path: Path, embeddings) -> None:
+    index = build_index(matrix)
+
+    ids = [str(uuid.uuid4()) for _ in splits]
+    vectorstore = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(dict(zip(ids, splits))),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+    db_faiss_path.mkdir(parents=True, exist_ok=True)
+    vectorstore.save_local(str(db_faiss_path))
+
+
+def merge_all(done: set, embeddings) -> None:
+    # One global index, so search opens a single contiguous store instead of one per PDF.
+    # HNSW has no native merge, so the stored vectors are reconstructed and built into a fresh graph.
+    store_dirs = [VECTORSTORE_DIR / f"db_faiss_{stem}" for stem in sorted(done)]
+    if not store_dirs:
+        return
+
+    matrices = []
+    offset = 0
+    docs = {}
+    index_to_docstore_id = {}
+    for store_dir in tqdm(store_dirs, desc="Merging"):
+        src = FAISS.load_local(str(store_dir), embeddings, allow_dangerous_deserialization=True)
+        matrices.append(src.index.reconstruct_n(0, src.index.ntotal))
+        for position, doc_id in src.index_to_docstore_id.items():
+            index_to_docstore_id[offset + position] = doc_id
+            docs[doc_id] = src.docstore.search(doc_id)
+        offset += src.index.ntotal
+
+    vectorstore = FAISS(
+        embedding_function=embeddings,
+        index=build_index(np.vstack(matrices)),
+        docstore=InMemoryDocstore(docs),
+        index_to_docstore_id=index_to_docstore_id,
+    )
+    COMBINED_DIR.mkdir(parents=True, exist_ok=True)
+    vectorstore.save_local(str(COMBINED_DIR))
+
+
+async def ingest(pending: list, done: set, embeddings) -> tuple:
+    """Returns ("ok" or "fatal", dropped stems); "fatal" means the embeddings API raised and the run must stop"""
+    # Embedding requests are pure network latency, so one event loop keeps many in flight
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+    all_splits = {}
+    # One float32 (chunks x dim) buffer per PDF, allocated when its first vectors arrive
+    vectors = {}
+    remaining = {}
+    dropped = []
+    positions = []
+    tasks = []
+    saved = 0
+
+    async def embed_batch(batch):
+        texts = [all_splits[i][j].page_content for i, j in batch]
+        async with semaphore:
+            try:
+                return batch, await embeddings.aembed_documents(texts)
+            except RuntimeError as e:
+                print("\n", e)
+                print(f"\n{sorted({pending[i].name for i, _ in batch})}")
+                return batch, None
+
+    def submit_batches(min_size):
+        # Embed (pdf, chunk) positions EMBED_BATCH_SIZE at a time across files
+        while positions and len(positions) >= min_size:
+            batch = positions[:EMBED_BATCH_SIZE]
+            del positions[:EMBED_BATCH_SIZE]
+            tasks.append(asyncio.create_task(embed_batch(batch)))
+
+    # PDFs are read and split in worker processes while batches of already split PDFs are being embedded
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        async def split_pdf(i):
+            return i, await loop.run_in_executor(executor, load_splits, pending[i])
+
+        splitting = [split_pdf(i) for i in range(len(pending))]
+        for next_split in tqdm(asyncio.as_completed(splitting), total=len(splitting), desc="Splitting"):
+            i, splits = await next_split
+            # PDFs without any text cannot be indexed
+            if not splits:
+                dropped.append(pending[i].stem)
+                continue
+            all_splits[i] = splits
+            remaining[i] = len(splits)
+            positions.extend((i, j) for j in range(len(splits)))
+            submit_batches(EMBED_BATCH_SIZE)
+    submit_batches(1)
+
+    for next_done in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Embedding"):
+        batch, batch_vectors = await next_done
+        if batch_vectors is None:
+            return "fatal", dropped
+
+        # Save each PDF's store as soon as its last chunk comes back
+        batch_matrix = np.asarray(batch_vectors, dtype=np.float32)
+        for (i, j), vector in zip(batch, batch_matrix):
+            if i not in vectors:
+                vectors[i] = np.empty((len(all_splits[i]), batch_matrix.shape[1]), dtype=np.float32)
+            vectors[i][j] = vector
+            remaining[i] -= 1
+            if remaining[i] == 0:
+                db_faiss_path = VECTORSTORE_DIR / f"db_faiss_{pending[i].stem}"
+                save_vectorstore(all_splits[i], vectors.pop(i), db_faiss_path, embeddings)
+                done.add(pending[i].stem)
+                saved += 1
+                if saved % MANIFEST_FLUSH_EVERY == 0:
+                    save_manifest(done)
+
+    return "ok", dropped
 
 
 def main():
     contents = pd.read_csv(CSV_FILE)
-    contents["Date"] = pd.to_datetime(contents["Date"])
 
-    pdf_files = []
-    for _, row in contents.iterrows():
-        year = row["Date"].year
-        document = REPORTS_DIR / str(year) / f'{row["Filename"]}.pdf'
-        if document.exists():
-            pdf_files.append(document)
+    # Membership tests against one walk of the reports tree instead of a stat per row
+    year_files = index_reports()
+    years = pd.to_datetime(contents["Date"]).dt.year.tolist()
+    pdf_files = [
+        REPORTS_DIR / str(year) / f"{filename}.pdf"
+        for filename, year in zip(contents["Filename"], years)
+        if filename in year_files.get(year, ())
+    ]
 
-    for pdf_file in (progress_bar := tqdm(pdf_files)):
-        progress_bar.set_description(f"Processing {pdf_file.name}")
-        file_name = pdf_file.stem
-        db_faiss_path = VECTORSTORE_DIR / f"db_faiss_{file_name}"
-
-        if (db_faiss_path / "index.faiss").exists() and (db_faiss_path / "index.pkl").exists():
+    # Completed PDFs come from the manifest; only stems missing from it are checked on disk,
+    # which also picks up stores built before the manifest existed
+    done = load_manifest()
+    pending = []
+    for pdf_file in pdf_files:
+        if pdf_file.stem in done:
             continue
+        if is_vectorized(VECTORSTORE_DIR / f"db_faiss_{pdf_file.stem}"):
+            done.add(pdf_file.stem)
+        else:
+            pending.append(pdf_file)
+    embeddings = GoogleGenerativeAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        google_api_key=API_KEY,
+    )
+
+    status, dropped = asyncio.run(ingest(pending, done, embeddings))
+    save_manifest(done)
+
+    # Remove dropped articles from the already loaded dataset and rewrite it once
+    if dropped:
+        contents = contents[~contents["Filename"].isin(dropped)]
+        contents.to_csv(CSV_FILE, index=False)
+        for pdf_file in dropped:
+            print(f"\nArticle {pdf_file} was deleted from dataset")
+
+    if status == "fatal":
+        exit()
 
-        vectorize_pdf(pdf_file, db_faiss_path, API_KEY)
+    merge_all(done, embeddings)
 
 
 if __name__ == "__main__":
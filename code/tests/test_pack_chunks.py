@@ -0,0 +1,25 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+for module in ("faiss", "numpy", "pandas", "pypdfium2", "tqdm", "dotenv",
+               "langchain_core", "langchain_community", "langchain_google_genai"):
+    pytest.importorskip(module)
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from preprocessPdf_embeddings import CHUNK_SIZE, fast_split  # noqa: E402
+
+
+@pytest.mark.parametrize("text", [
+    "This is a sentence in a report. " * 70 + "\n\n" + "0123456789abcdef " * 200,
+    "Sentence one. " * 400 + "\n\n" + "x" * 5000,
+])
+def test_breakless_run_is_hard_cut(text):
+    # A long run without breaks must not make the packer creep forward one character at a time
+    chunks = fast_split(text)
+    assert len(chunks) <= 2 * len(text) // CHUNK_SIZE + 2
+    assert all(len(chunk) <= CHUNK_SIZE for chunk in chunks)
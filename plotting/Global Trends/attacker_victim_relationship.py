@@ -621,7 +621,7 @@ def process_filter_data(input_csv):
     # ------------------------------
     # Load and Prepare Data
     # ------------------------------
-    df = pd.read_csv(input_csv)
+    df = pd.read_csv(input_csv, usecols=['Threat Actor', 'Victim Country'])
     
     # Filter out rows with missing Threat Actor or Victim Country
     df = df.dropna(subset=['Threat Actor', 'Victim Country'])
@@ -732,27 +732,21 @@ def process_filter_data(input_csv):
     # ------------------------------
     # Generate Threat–Victim pairs
     # ------------------------------
-    processed_data = []
-    for _, row in df_exploded.iterrows():
-        threat_country = row['Threat_country']  # Now a code like 'CN', 'RU', etc.
-        victim_country = row['Victim_country']  # Now a code like 'US', 'IN', etc.
-        
-        if threat_country and victim_country:
-            processed_data.append([threat_country, victim_country])
-    
-    new_df = pd.DataFrame(processed_data, columns=['Threat_country', 'Victim_country'])
-    
-    # Count occurrences
-    new_df['Value'] = new_df.groupby(['Threat_country', 'Victim_country'])['Victim_country'].transform('count')
-    new_df = new_df.drop_duplicates()
+    # Codes like 'CN', 'RU' (attacker) and 'US', 'IN' (victim); count occurrences of each pair
+    new_df = (
+        df_exploded.groupby(['Threat_country', 'Victim_country'], sort=False, observed=True)
+        .size()
+        .reset_index(name='Value')
+    )
     
     # ------------------------------
     # Filter to top 20 countries
     # ------------------------------
     country_value_sum = new_df.groupby('Threat_country')['Value'].sum()
     
-    top_20_countries = country_value_sum.nlargest(20).index.tolist()
+    top_20_countries = country_value_sum.nlargest(20).index
     
+    new_df['Threat_country'] = new_df['Threat_country'].astype('category')
     final_df = new_df[new_df['Threat_country'].isin(top_20_countries)]
     
     print(f"[✓] Mapped {len(df_exploded)} threat actor-victim pairs")
@@ -2,42 +2,100 @@
 # This figure corresponds to Figure 5(b) in the paper 
 # Section 4.1: Initial Attack Vectors
 
+import glob
+import os
+import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 
 INPUT_CSV = '../../ArticlesDataset_LLMAnswered.csv'
+CACHE_DIR = '.cache'
+CACHE_VERSION = 1  # Bump when process_filter_data changes to invalidate old caches
 OUTPUT_PDF = 'Figure5b_AttackVectorChanges.pdf'
 
+# ------------------------------
+# Set the color palette for each attack vector
+# ------------------------------
+FULL_TAB20 = sns.color_palette("tab20", 20)
+
+COLOR_MAP = {
+    'Malicious Documents': FULL_TAB20[0],
+    'Spear Phishing': FULL_TAB20[2],
+    'Vulnerability Exploitation': FULL_TAB20[4],
+    'Covert Channels': FULL_TAB20[5],
+    'Credential Reuse': FULL_TAB20[9],
+    'Drive-By Download': FULL_TAB20[8],
+    'Meta Data Monitoring': FULL_TAB20[6],     
+    'Phishing': FULL_TAB20[7],
+    'Removable Media': FULL_TAB20[10],
+    'Social Engineering': FULL_TAB20[11],
+    'Watering Hole': FULL_TAB20[14],
+    'Website Equipping': FULL_TAB20[15] 
+}
+
+DEFAULT_COLOR = (0.5, 0.5, 0.5)  # Gray for unmapped vectors
+
+# Comprehensive mapping for attack vector variations
+ATTACK_VECTORS_MAPPING = {
+    'Exploit Vulnerability': 'Vulnerability Exploitation',
+    'Spearphishing': 'Spear Phishing',  # Handle case variations
+    'Spear-Phishing': 'Spear Phishing',
+    'Spear Phishing': 'Spear Phishing',
+    'Drive-By Download': 'Drive-By Download',
+    'Drive By Download': 'Drive-By Download',
+    'Driveby Download': 'Drive-By Download',
+    'Watering Hole': 'Watering Hole',
+    'Wateringhole': 'Watering Hole',
+    'Social Engineering': 'Social Engineering',
+    'Malicious Documents': 'Malicious Documents',
+    'Phishing': 'Phishing',
+    'Credential Reuse': 'Credential Reuse',
+    'Removable Media': 'Removable Media',
+    'Website Equipping': 'Website Equipping',
+    'Covert Channels': 'Covert Channels',
+    'Meta Data Monitoring': 'Meta Data Monitoring',
+    'Metadata Monitoring': 'Meta Data Monitoring',
+}
+
 '''
 Function to process the original data and filter to the attack vectors
 Counts the number of attacks per year for each attack vector
 '''
 def process_filter_data(input_csv, col):
+    # ------------------------------
+    # Reuse the cached result if the CSV is unchanged
+    # ------------------------------
+    mtime = os.stat(input_csv).st_mtime_ns
+    cache_prefix = os.path.join(CACHE_DIR, col.replace(' ', ''))
+    cache_path = f"{cache_prefix}_v{CACHE_VERSION}_{mtime}.parquet"
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path, engine='pyarrow')
+
     # ------------------------------
     # Load and Prepare Data
     # ------------------------------
-    df = pd.read_csv(input_csv)
+    df = pd.read_csv(input_csv, usecols=['Date', col], dtype={col: 'string'})
     
-    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce', cache=True)
     df['Year'] = df['Date'].dt.year
 
     # ------------------------------
     # Process the column
     # ------------------------------
     results = []
-    df_filtered = df.dropna(subset=[col]).copy()
-    # Filter out "Not mentioned" values
-    df_filtered = df_filtered[df_filtered[col].astype(str).str.lower() != 'not mentioned']
+    # Filter out missing, empty and "Not mentioned" values in one pass
+    norm = df[col].str.strip().str.lower()
+    mask = norm.notna() & (norm != 'not mentioned') & (norm != '')
+    df_filtered = df.loc[mask.fillna(False)].copy()
     
     # Handle comma-separated values, remove trailing periods
-    df_filtered[col] = df_filtered[col].astype(str).str.replace('.', '', regex=False)
-    df_filtered[col] = df_filtered[col].str.split(',')
-    df_filtered[col] = df_filtered[col].apply(lambda items: [item.strip() for item in items if item.strip() and item.strip().lower() != 'not mentioned'])
+    df_filtered[col] = df_filtered[col].str.replace('.', '', regex=False).str.split(',')
     df_exploded = df_filtered.explode(col)
     
-    # Filter out any remaining "Not mentioned" values after explode
-    df_exploded = df_exploded[df_exploded[col].astype(str).str.lower() != 'not mentioned']
+    # Strip items and drop empty or "Not mentioned" entries after explode
+    df_exploded[col] = s = df_exploded[col].str.strip()
+    df_exploded = df_exploded[(s.ne('') & s.str.lower().ne('not mentioned')).fillna(False)]
     
     grouped = df_exploded.groupby(['Year', col]).size().reset_index(name='Attacks')
     grouped['Column'] = col.replace(' ', '')
@@ -47,6 +105,12 @@ def process_filter_data(input_csv, col):
     # Combine all results into a single DataFrame
     final_df = pd.concat(results, ignore_index=True)
 
+    # Replace any stale cache for this column
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    for stale_path in glob.glob(f"{glob.escape(cache_prefix)}_*.parquet"):
+        os.remove(stale_path)
+    final_df.to_parquet(cache_path, engine='pyarrow', index=False)
+
     return final_df
 
 # Function to draw the figure
@@ -58,134 +122,78 @@ def draw_figure(input_df):
     # ------------------------------
     vector_df = df[df['Column'] == 'AttackVector'].reset_index(drop=True)
     
-    # Filter out "Not mentioned" values
-    vector_df = vector_df[vector_df['Subcategory'].astype(str).str.lower() != 'not mentioned']
-    
     vector_df['Subcategory'] = vector_df['Subcategory'].str.strip().str.title()
 
-    # Comprehensive mapping for attack vector variations
-    attack_vectors_mapping = {
-        'Exploit Vulnerability': 'Vulnerability Exploitation',
-        'Spearphishing': 'Spear Phishing',  # Handle case variations
-        'Spear-Phishing': 'Spear Phishing',
-        'Spear Phishing': 'Spear Phishing',
-        'Drive-By Download': 'Drive-By Download',
-        'Drive By Download': 'Drive-By Download',
-        'Driveby Download': 'Drive-By Download',
-        'Watering Hole': 'Watering Hole',
-        'Wateringhole': 'Watering Hole',
-        'Social Engineering': 'Social Engineering',
-        'Malicious Documents': 'Malicious Documents',
-        'Phishing': 'Phishing',
-        'Credential Reuse': 'Credential Reuse',
-        'Removable Media': 'Removable Media',
-        'Website Equipping': 'Website Equipping',
-        'Covert Channels': 'Covert Channels',
-        'Meta Data Monitoring': 'Meta Data Monitoring',
-        'Metadata Monitoring': 'Meta Data Monitoring',
-    }
-    vector_df['Subcategory'] = vector_df['Subcategory'].replace(attack_vectors_mapping)
+    mapped = vector_df['Subcategory'].map(ATTACK_VECTORS_MAPPING)
+    vector_df['Subcategory'] = mapped.fillna(vector_df['Subcategory'])
     
     # Handle case-insensitive matching for remaining variations
-    # This function extracts the main attack vector category from descriptions
-    def normalize_vector_name(name):
-        if pd.isna(name):
-            return name
-        name_str = str(name).strip()
-        name_lower = name_str.lower()
-        
-        # Remove markdown formatting if present
-        if '**' in name_str:
-            # Extract text between ** markers
-            parts = name_str.split('**')
-            if len(parts) >= 2:
-                name_str = parts[1].strip().rstrip(':')
-                name_lower = name_str.lower()
-        
+    # This extracts the main attack vector category from descriptions,
+    # with every check run as a vectorized mask over the whole column
+    def normalize_vector_names(series):
+        s = series.astype('string').str.strip()
+
+        # Remove markdown formatting if present (text between ** markers)
+        md = s.str.extract(r'\*\*(.*?)(?:\*\*|$)', expand=False)
+        s = s.mask(md.notna(), md.str.strip().str.rstrip(':'))
+
         # Extract main category before colon or parenthesis (e.g., "Exploit Vulnerability: SQL injection" -> "Exploit Vulnerability")
-        if ':' in name_str:
-            name_str = name_str.split(':')[0].strip()
-            name_lower = name_str.lower()
-        if '(' in name_str:
-            name_str = name_str.split('(')[0].strip()
-            name_lower = name_str.lower()
-        
         # Remove trailing periods and clean up
-        name_str = name_str.rstrip('.').strip()
-        name_lower = name_str.lower()
-        
+        s = s.str.replace(r'(?s)[:(].*', '', regex=True).str.strip().str.rstrip('.').str.strip().str.lower()
+
+        def has(pattern):
+            return s.str.contains(pattern, regex=False, na=False).to_numpy(dtype=bool)
+
+        exploit = has('exploit')
         # Check for common patterns (order matters - check more specific first)
-        if 'spear' in name_lower and 'phish' in name_lower:
-            return 'Spear Phishing'
-        elif 'drive' in name_lower and ('by' in name_lower or 'by' in name_str) and 'download' in name_lower:
-            return 'Drive-By Download'
-        elif 'watering' in name_lower and 'hole' in name_lower:
-            return 'Watering Hole'
-        elif 'exploit' in name_lower and 'vulnerability' in name_lower:
-            return 'Vulnerability Exploitation'
-        elif 'exploit' in name_lower and ('cve' in name_lower or 'sql' in name_lower or 'injection' in name_lower or 'brute' in name_lower):
+        conditions = [
+            has('spear') & has('phish'),
+            has('drive') & has('by') & has('download'),
+            has('watering') & has('hole'),
+            exploit & has('vulnerability'),
             # Specific exploit types should map to Vulnerability Exploitation
-            return 'Vulnerability Exploitation'
-        elif 'social' in name_lower and 'engineering' in name_lower:
-            return 'Social Engineering'
-        elif 'malicious' in name_lower and 'document' in name_lower:
-            return 'Malicious Documents'
-        elif 'phishing' in name_lower:
-            return 'Phishing'
-        elif 'credential' in name_lower and 'reuse' in name_lower:
-            return 'Credential Reuse'
-        elif 'removable' in name_lower and 'media' in name_lower:
-            return 'Removable Media'
-        elif 'website' in name_lower and 'equipping' in name_lower:
-            return 'Website Equipping'
-        elif 'covert' in name_lower and 'channel' in name_lower:
-            return 'Covert Channels'
-        elif 'metadata' in name_lower or ('meta' in name_lower and 'data' in name_lower and 'monitoring' in name_lower):
-            return 'Meta Data Monitoring'
-        
-        # If it's a single word or very short, might be a category name itself
-        # Check if it matches any of our standard categories (case-insensitive)
-        standard_categories_map = {
-            'spear phishing': 'Spear Phishing',
-            'drive-by download': 'Drive-By Download',
-            'drive by download': 'Drive-By Download',
-            'watering hole': 'Watering Hole',
-            'vulnerability exploitation': 'Vulnerability Exploitation',
-            'exploit vulnerability': 'Vulnerability Exploitation',
-            'social engineering': 'Social Engineering',
-            'malicious documents': 'Malicious Documents',
-            'phishing': 'Phishing',
-            'credential reuse': 'Credential Reuse',
-            'removable media': 'Removable Media',
-            'website equipping': 'Website Equipping',
-            'covert channels': 'Covert Channels',
-            'meta data monitoring': 'Meta Data Monitoring',
-            'metadata monitoring': 'Meta Data Monitoring'
-        }
-        
-        # Normalize the name for comparison (remove hyphens, underscores, extra spaces)
-        name_normalized = ' '.join(name_lower.replace('-', ' ').replace('_', ' ').split())
-        
-        for cat_key, cat_value in standard_categories_map.items():
-            cat_normalized = ' '.join(cat_key.replace('-', ' ').replace('_', ' ').split())
-            # Exact match or name starts with category (e.g., "Phishing (via spam)" starts with "Phishing")
-            if name_normalized == cat_normalized or name_normalized.startswith(cat_normalized + ' '):
-                return cat_value
-        
+            exploit & (has('cve') | has('sql') | has('injection') | has('brute')),
+            has('social') & has('engineering'),
+            has('malicious') & has('document'),
+            has('phishing'),
+            has('credential') & has('reuse'),
+            has('removable') & has('media'),
+            has('website') & has('equipping'),
+            has('covert') & has('channel'),
+            has('metadata') | (has('meta') & has('data') & has('monitoring')),
+        ]
+        choices = [
+            'Spear Phishing',
+            'Drive-By Download',
+            'Watering Hole',
+            'Vulnerability Exploitation',
+            'Vulnerability Exploitation',
+            'Social Engineering',
+            'Malicious Documents',
+            'Phishing',
+            'Credential Reuse',
+            'Removable Media',
+            'Website Equipping',
+            'Covert Channels',
+            'Meta Data Monitoring',
+        ]
+
         # If no match found, return None to filter it out (it's likely noise)
-        return None
+        return np.select(conditions, choices, default=None)
     
     # Apply normalization to any remaining unmapped vectors
-    unmapped = vector_df[~vector_df['Subcategory'].isin(attack_vectors_mapping.values())]['Subcategory'].unique()
+    unmapped = vector_df[~vector_df['Subcategory'].isin(ATTACK_VECTORS_MAPPING.values())]['Subcategory'].unique()
     if len(unmapped) > 0:
         print(f"[INFO] Normalizing {len(unmapped)} unmapped attack vectors")
-        vector_df['Subcategory'] = vector_df['Subcategory'].apply(normalize_vector_name)
+        vector_df['Subcategory'] = normalize_vector_names(vector_df['Subcategory'])
         # Filter out None values (unmappable vectors)
         vector_df = vector_df[vector_df['Subcategory'].notna()].copy()
     
     # Aggregate duplicates: after mapping, we might have multiple rows with same Year-Subcategory
     # Sum up the attacks for each Year-Subcategory combination
-    vector_df = vector_df.groupby(['Year', 'Subcategory'])['Attacks'].sum().reset_index()
+    # (categorical keys let groupby hash int codes instead of strings)
+    vector_df['Subcategory'] = vector_df['Subcategory'].astype('category')
+    vector_df = vector_df.groupby(['Year', 'Subcategory'], observed=True)['Attacks'].sum().reset_index()
 
     pivot_df = vector_df.pivot(index='Year', columns='Subcategory', values='Attacks').fillna(0)
 
@@ -197,34 +205,13 @@ def draw_figure(input_df):
     top_three_vectors = total_attacks.head(3).index
     remaining_vectors = total_attacks.index.difference(top_three_vectors)
     ordered_columns = top_three_vectors.tolist() + remaining_vectors.tolist()
-    pivot_df = pivot_df[ordered_columns]
-
-    # ------------------------------
-    # Set the color palette for each attack vector
-    # ------------------------------
-    full_tab20 = sns.color_palette("tab20", 20)
-
-    color_map = {
-        'Malicious Documents': full_tab20[0],
-        'Spear Phishing': full_tab20[2],
-        'Vulnerability Exploitation': full_tab20[4],
-        'Covert Channels': full_tab20[5],
-        'Credential Reuse': full_tab20[9],
-        'Drive-By Download': full_tab20[8],
-        'Meta Data Monitoring': full_tab20[6],     
-        'Phishing': full_tab20[7],
-        'Removable Media': full_tab20[10],
-        'Social Engineering': full_tab20[11],
-        'Watering Hole': full_tab20[14],
-        'Website Equipping': full_tab20[15] 
-    }
+    pivot_df = pivot_df.reindex(columns=ordered_columns)
 
     # Handle missing vectors gracefully - use a default color if not in map
-    default_color = (0.5, 0.5, 0.5)  # Gray for unmapped vectors
-    colors = [color_map.get(vector, default_color) for vector in pivot_df.columns]
+    colors = [COLOR_MAP.get(vector, DEFAULT_COLOR) for vector in pivot_df.columns]
     
     # Warn about any missing vectors
-    missing_vectors = [vector for vector in pivot_df.columns if vector not in color_map]
+    missing_vectors = [vector for vector in pivot_df.columns if vector not in COLOR_MAP]
     if missing_vectors:
         print(f"[WARNING] Attack vectors not in color_map (using gray): {missing_vectors}")
 
@@ -259,32 +246,30 @@ def draw_figure(input_df):
     # Make axis lines more bold
     ax = plt.gca()
 
-    attacks_per_year = pivot_df.sum(axis=1).tolist()
-
-    # Loop through each bar (year)
-    for i, (index, row) in enumerate(pivot_df.iterrows()):
-        cumulative_bottom = 0  # Start at the bottom of the bar
-        
-        # Determine top 3 vectors for this year
-        top3_this_year = row.sort_values(ascending=False).head(3).index
-
-        for category in pivot_df.columns:
-            height = row[category]
-            if category in top3_this_year and height > 0:
-                x_pos = i
-                y_pos = cumulative_bottom + height / 2
-
-                ax.text(
-                    x_pos,
-                    y_pos,
-                    f"{(height / attacks_per_year[i]) * 100:.0f}%",
-                    ha='center',
-                    va='center',
-                    fontsize=42,
-                    fontweight='bold',
-                    color='white'
-                )
-            cumulative_bottom += height
+    vals = pivot_df.to_numpy()
+
+    # Determine top 3 vectors for each year (bar)
+    k = min(3, vals.shape[1])
+    top3_idx = np.argpartition(-vals, k - 1, axis=1)[:, :k]
+    top3_mask = np.zeros(vals.shape, dtype=bool)
+    np.put_along_axis(top3_mask, top3_idx, True, axis=1)
+
+    # Label each segment at its vertical center with its share of the year
+    y_centers = np.cumsum(vals, axis=1) - vals / 2
+    totals = vals.sum(axis=1, keepdims=True)
+    pct = np.divide(vals, totals, out=np.zeros_like(vals, dtype=float), where=totals > 0) * 100
+
+    for i, j in zip(*np.nonzero(top3_mask & (vals > 0))):
+        ax.text(
+            i,
+            y_centers[i, j],
+            f"{pct[i, j]:.0f}%",
+            ha='center',
+            va='center',
+            fontsize=42,
+            fontweight='bold',
+            color='white'
+        )
 
     for spine in ax.spines.values():
         spine.set_linewidth(3)  
@@ -2,64 +2,125 @@
 # This figure corresponds to Figure 5(a) in the paper 
 # Section 4.1: Target Sectors
 
+import glob
+import os
+import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 
 INPUT_CSV = '../../ArticlesDataset_LLMAnswered.csv'
+CACHE_DIR = '.cache'
+CACHE_VERSION = 1  # Bump when process_filter_data changes to invalidate old caches
 OUTPUT_PDF = 'Figure5a_TargetSectorChanges.pdf' 
 
+# ------------------------------
+# Set the color palette for each target sector
+# ------------------------------
+FULL_TAB20 = sns.color_palette("tab20", 20)
+
+COLOR_MAP = {
+    'Government/Defense': FULL_TAB20[0],
+    'Corporation/Business': FULL_TAB20[2],
+    'Education/Research': FULL_TAB20[4],
+    'Cloud/IoT': FULL_TAB20[5],
+    'Critical': FULL_TAB20[9],
+    'Energy/Utility': FULL_TAB20[8],
+    'Financial': FULL_TAB20[6],     
+    'Healthcare': FULL_TAB20[7],
+    'Individual': FULL_TAB20[10],
+    'Manufacturing': FULL_TAB20[11],
+    'Media/Entertainment': FULL_TAB20[14],
+    'NGO/Nonprofit': FULL_TAB20[15] 
+}
+
+DEFAULT_COLOR = (0.5, 0.5, 0.5)  # Gray for unmapped sectors
+
+TARGET_SECTOR_MAPPING = {
+    'Government And Defense Agencies': 'Government/Defense',
+    'Corporations And Businesses': 'Corporation/Business',
+    'Financial Institutions': 'Financial',
+    'Healthcare': 'Healthcare',
+    'Energy And Utilities': 'Energy/Utility',
+    'Cloud/Iot Services': 'Cloud/IoT',
+    'Manufacturing': 'Manufacturing',
+    'Education And Research Institutions': 'Education/Research',
+    'Media And Entertainment Companies': 'Media/Entertainment',
+    'Critical Infrastructure': 'Critical',
+    'Non-Governmental Organizations (Ngos) And Nonprofits': 'NGO/Nonprofit',
+    'Individuals': 'Individual',
+    # Map sub-sectors to main categories
+    'Aerospace': 'Government/Defense',  # Aerospace is typically defense-related
+    'Defense': 'Government/Defense',
+    'Aviation': 'Manufacturing',  # Aviation manufacturing
+    'Aircraft Services': 'Corporation/Business',
+}
+
+# Keyword patterns for sectors left unmapped (order matters - first match wins)
+SECTOR_PATTERNS = [
+    (r'government|defense|military', 'Government/Defense'),
+    (r'financial|bank', 'Financial'),
+    (r'health|medical', 'Healthcare'),
+    (r'energy|utility', 'Energy/Utility'),
+    (r'education|research|university', 'Education/Research'),
+    (r'manufacturing|industrial', 'Manufacturing'),
+    (r'media|entertainment', 'Media/Entertainment'),
+    (r'individual|person', 'Individual'),
+    (r'ngo|nonprofit|non-profit', 'NGO/Nonprofit'),
+    (r'critical|infrastructure', 'Critical'),
+    (r'cloud|iot', 'Cloud/IoT'),
+    (r'corporation|business|company', 'Corporation/Business'),
+]
+
 '''
 Function to process the original data and filter to the target sectors
 Count the number of attacks per year for each target sector
 '''
 def process_filter_data(input_csv, col):
+    # ------------------------------
+    # Reuse the cached result if the CSV is unchanged
+    # ------------------------------
+    mtime = os.stat(input_csv).st_mtime_ns
+    cache_prefix = os.path.join(CACHE_DIR, col.replace(' ', ''))
+    cache_path = f"{cache_prefix}_v{CACHE_VERSION}_{mtime}.parquet"
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path, engine='pyarrow')
+
     # ------------------------------
     # Load and Prepare Data
     # ------------------------------
-    df = pd.read_csv(input_csv)
+    df = pd.read_csv(input_csv, usecols=['Date', col], dtype={col: 'string'})
 
-    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce', cache=True)
     df['Year'] = df['Date'].dt.year
 
     # ------------------------------
     # Process the column
     # ------------------------------
     results = []
-    df_filtered = df.dropna(subset=[col]).copy()
+    # Filter out missing, empty and "Not mentioned" values in one pass
+    norm = df[col].str.strip().str.lower()
+    mask = norm.notna() & (norm != 'not mentioned') & (norm != '')
+    df_filtered = df.loc[mask.fillna(False)].copy()
     # Handle multi-line format with markdown-style formatting
     # Extract sector names from lines like "*   **Sector Name:** ..."
-    # Also handles simple comma-separated format
-    def extract_sectors(text):
-        if pd.isna(text) or text == '' or str(text).strip() == '':
-            return []
-        text_str = str(text).strip()
-        sectors = []
-        
-        # First, try to extract from markdown format (lines with **)
-        if '**' in text_str:
-            for line in text_str.split('\n'):
-                line = line.strip()
-                if '**' in line:
-                    # Extract text between ** markers
-                    parts = line.split('**')
-                    if len(parts) >= 2:
-                        sector = parts[1].strip().rstrip(':')
-                        if sector and sector not in sectors:
-                            sectors.append(sector)
-        
-        # If no markdown format found or found some, also try comma-separated
-        if not sectors or (len(sectors) == 0):
-            # Try comma-separated format
-            for sector in text_str.split(','):
-                sector = sector.strip().rstrip('.')
-                if sector and sector not in sectors:
-                    sectors.append(sector)
-        
-        return sectors
-    
-    df_filtered[col] = df_filtered[col].apply(extract_sectors)
-    df_exploded = df_filtered.explode(col)
+    text = df_filtered[col].str.strip()
+    md_mask = text.str.contains('**', regex=False, na=False)
+    # Take the text between the first pair of ** markers on each line
+    md = text[md_mask].str.extractall(r'(?m)^(?:(?!\*\*).)*?\*\*(.*?)(?:\*\*|$)')[0]
+    md = md.str.strip().str.rstrip(':')
+    md = md[md != ''].droplevel('match')
+
+    # Also handles simple comma-separated format, and markdown rows
+    # where no sector could be extracted
+    plain = text[~text.index.isin(md.index)].str.split(',').explode()
+    plain = plain.str.strip().str.rstrip('.')
+    plain = plain[plain != '']
+
+    # Keep each sector once per article
+    sectors = pd.concat([md, plain]).rename(col)
+    sectors = sectors[~sectors.reset_index().duplicated().to_numpy()]
+    df_exploded = df_filtered[['Year']].join(sectors, how='inner')
     
     grouped = df_exploded.groupby(['Year', col]).size().reset_index(name='Attacks')
     grouped['Column'] = col.replace(' ', '')
@@ -69,6 +130,12 @@ def process_filter_data(input_csv, col):
     # Combine all results into a single DataFrame
     final_df = pd.concat(results, ignore_index=True)
 
+    # Replace any stale cache for this column
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    for stale_path in glob.glob(f"{glob.escape(cache_prefix)}_*.parquet"):
+        os.remove(stale_path)
+    final_df.to_parquet(cache_path, engine='pyarrow', index=False)
+
     return final_df
 
 # Function to draw the figure
@@ -81,68 +148,32 @@ def draw_figure(input_df):
     sector_df = df[df['Column'] == 'TargetSector'].reset_index(drop=True)
     sector_df['Subcategory'] = sector_df['Subcategory'].str.strip().str.title()
 
-    target_sector_mapping = {
-        'Government And Defense Agencies': 'Government/Defense',
-        'Corporations And Businesses': 'Corporation/Business',
-        'Financial Institutions': 'Financial',
-        'Healthcare': 'Healthcare',
-        'Energy And Utilities': 'Energy/Utility',
-        'Cloud/Iot Services': 'Cloud/IoT',
-        'Manufacturing': 'Manufacturing',
-        'Education And Research Institutions': 'Education/Research',
-        'Media And Entertainment Companies': 'Media/Entertainment',
-        'Critical Infrastructure': 'Critical',
-        'Non-Governmental Organizations (Ngos) And Nonprofits': 'NGO/Nonprofit',
-        'Individuals': 'Individual',
-        # Map sub-sectors to main categories
-        'Aerospace': 'Government/Defense',  # Aerospace is typically defense-related
-        'Defense': 'Government/Defense',
-        'Aviation': 'Manufacturing',  # Aviation manufacturing
-        'Aircraft Services': 'Corporation/Business',
-    }
-    sector_df['Subcategory'] = sector_df['Subcategory'].replace(target_sector_mapping)
+    mapped = sector_df['Subcategory'].map(TARGET_SECTOR_MAPPING)
+    sector_df['Subcategory'] = mapped.fillna(sector_df['Subcategory'])
     
     # If there are still unmapped sectors, map them to the closest category or drop them
     # First, let's see what's left unmapped
-    unmapped = sector_df[~sector_df['Subcategory'].isin(target_sector_mapping.values())]['Subcategory'].unique()
+    # Valid categories are the values in TARGET_SECTOR_MAPPING
+    valid_categories = set(TARGET_SECTOR_MAPPING.values())
+    unmapped_mask = ~sector_df['Subcategory'].isin(valid_categories)
+    unmapped = sector_df.loc[unmapped_mask, 'Subcategory']
     if len(unmapped) > 0:
-        print(f"[WARNING] Found unmapped sectors: {unmapped}")
+        print(f"[WARNING] Found unmapped sectors: {unmapped.unique()}")
         # For now, we'll map common patterns
-        additional_mappings = {}
-        for sector in unmapped:
-            sector_lower = sector.lower()
-            if 'government' in sector_lower or 'defense' in sector_lower or 'military' in sector_lower:
-                additional_mappings[sector] = 'Government/Defense'
-            elif 'financial' in sector_lower or 'bank' in sector_lower:
-                additional_mappings[sector] = 'Financial'
-            elif 'health' in sector_lower or 'medical' in sector_lower:
-                additional_mappings[sector] = 'Healthcare'
-            elif 'energy' in sector_lower or 'utility' in sector_lower:
-                additional_mappings[sector] = 'Energy/Utility'
-            elif 'education' in sector_lower or 'research' in sector_lower or 'university' in sector_lower:
-                additional_mappings[sector] = 'Education/Research'
-            elif 'manufacturing' in sector_lower or 'industrial' in sector_lower:
-                additional_mappings[sector] = 'Manufacturing'
-            elif 'media' in sector_lower or 'entertainment' in sector_lower:
-                additional_mappings[sector] = 'Media/Entertainment'
-            elif 'individual' in sector_lower or 'person' in sector_lower:
-                additional_mappings[sector] = 'Individual'
-            elif 'ngo' in sector_lower or 'nonprofit' in sector_lower or 'non-profit' in sector_lower:
-                additional_mappings[sector] = 'NGO/Nonprofit'
-            elif 'critical' in sector_lower or 'infrastructure' in sector_lower:
-                additional_mappings[sector] = 'Critical'
-            elif 'cloud' in sector_lower or 'iot' in sector_lower:
-                additional_mappings[sector] = 'Cloud/IoT'
-            elif 'corporation' in sector_lower or 'business' in sector_lower or 'company' in sector_lower:
-                additional_mappings[sector] = 'Corporation/Business'
+        low = unmapped.str.lower()
+        auto = np.select(
+            [low.str.contains(pattern, regex=True, na=False).to_numpy(dtype=bool) for pattern, _ in SECTOR_PATTERNS],
+            [category for _, category in SECTOR_PATTERNS],
+            default=None
+        )
+        auto_mask = pd.notna(auto)
         
-        if additional_mappings:
+        if auto_mask.any():
+            additional_mappings = dict(zip(unmapped[auto_mask], auto[auto_mask]))
             print(f"[INFO] Auto-mapping {len(additional_mappings)} sectors: {additional_mappings}")
-            sector_df['Subcategory'] = sector_df['Subcategory'].replace(additional_mappings)
+            sector_df.loc[unmapped_mask, 'Subcategory'] = unmapped.where(~auto_mask, auto)
         
         # Drop any remaining unmapped sectors (they're likely noise or sub-categories)
-        # Valid categories are the values in target_sector_mapping
-        valid_categories = set(target_sector_mapping.values())
         remaining_unmapped = sector_df[~sector_df['Subcategory'].isin(valid_categories)]['Subcategory'].unique()
         if len(remaining_unmapped) > 0:
             print(f"[INFO] Dropping {len(remaining_unmapped)} unmapped sectors: {remaining_unmapped}")
@@ -150,7 +181,9 @@ def draw_figure(input_df):
     
     # Aggregate duplicates: after mapping, we might have multiple rows with same Year-Subcategory
     # Sum up the attacks for each Year-Subcategory combination
-    sector_df = sector_df.groupby(['Year', 'Subcategory'])['Attacks'].sum().reset_index()
+    # (categorical keys let groupby hash int codes instead of strings)
+    sector_df['Subcategory'] = sector_df['Subcategory'].astype('category')
+    sector_df = sector_df.groupby(['Year', 'Subcategory'], observed=True)['Attacks'].sum().reset_index()
     
     pivot_df = sector_df.pivot(index='Year', columns='Subcategory', values='Attacks').fillna(0)
 
@@ -162,34 +195,13 @@ def draw_figure(input_df):
     top_three_sectors = total_attacks.head(3).index
     remaining_sectors = total_attacks.index.difference(top_three_sectors)
     ordered_columns = top_three_sectors.tolist() + remaining_sectors.tolist()
-    pivot_df = pivot_df[ordered_columns]
-
-    # ------------------------------
-    # Set the color palette for each target sector
-    # ------------------------------
-    full_tab20 = sns.color_palette("tab20", 20)
-
-    color_map = {
-        'Government/Defense': full_tab20[0],
-        'Corporation/Business': full_tab20[2],
-        'Education/Research': full_tab20[4],
-        'Cloud/IoT': full_tab20[5],
-        'Critical': full_tab20[9],
-        'Energy/Utility': full_tab20[8],
-        'Financial': full_tab20[6],     
-        'Healthcare': full_tab20[7],
-        'Individual': full_tab20[10],
-        'Manufacturing': full_tab20[11],
-        'Media/Entertainment': full_tab20[14],
-        'NGO/Nonprofit': full_tab20[15] 
-    }
+    pivot_df = pivot_df.reindex(columns=ordered_columns)
 
     # Handle missing sectors gracefully - use a default color if not in map
-    default_color = (0.5, 0.5, 0.5)  # Gray for unmapped sectors
-    colors = [color_map.get(sector, default_color) for sector in pivot_df.columns]
+    colors = [COLOR_MAP.get(sector, DEFAULT_COLOR) for sector in pivot_df.columns]
     
     # Warn about any missing sectors
-    missing_sectors = [sector for sector in pivot_df.columns if sector not in color_map]
+    missing_sectors = [sector for sector in pivot_df.columns if sector not in COLOR_MAP]
     if missing_sectors:
         print(f"[WARNING] Sectors not in color_map (using gray): {missing_sectors}")
 
@@ -224,32 +236,30 @@ def draw_figure(input_df):
     # Make axis lines more bold
     ax = plt.gca()
 
-    attacks_per_year = pivot_df.sum(axis=1).tolist()
+    vals = pivot_df.to_numpy()
 
-    # Loop through each bar (year)
-    for i, (index, row) in enumerate(pivot_df.iterrows()):
-        cumulative_bottom = 0  # Start at the bottom of the bar
-        
-        # Determine top 3 sectors for this year
-        top3_this_year = row.sort_values(ascending=False).head(3).index
-
-        for category in pivot_df.columns:
-            height = row[category]
-            if category in top3_this_year and height > 0:
-                x_pos = i
-                y_pos = cumulative_bottom + height / 2
-
-                ax.text(
-                    x_pos,
-                    y_pos,
-                    f"{(height / attacks_per_year[i]) * 100:.0f}%",
-                    ha='center',
-                    va='center',
-                    fontsize=40,
-                    fontweight='bold',
-                    color='white'
-                )
-            cumulative_bottom += height
+    # Determine top 3 sectors for each year (bar)
+    k = min(3, vals.shape[1])
+    top3_idx = np.argpartition(-vals, k - 1, axis=1)[:, :k]
+    top3_mask = np.zeros(vals.shape, dtype=bool)
+    np.put_along_axis(top3_mask, top3_idx, True, axis=1)
+
+    # Label each segment at its vertical center with its share of the year
+    y_centers = np.cumsum(vals, axis=1) - vals / 2
+    totals = vals.sum(axis=1, keepdims=True)
+    pct = np.divide(vals, totals, out=np.zeros_like(vals, dtype=float), where=totals > 0) * 100
+
+    for i, j in zip(*np.nonzero(top3_mask & (vals > 0))):
+        ax.text(
+            i,
+            y_centers[i, j],
+            f"{pct[i, j]:.0f}%",
+            ha='center',
+            va='center',
+            fontsize=40,
+            fontweight='bold',
+            color='white'
+        )
 
     for spine in ax.spines.values():
         spine.set_linewidth(3) 